@@ -0,0 +1,80 @@
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Analysis queue is full")
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    # Bounded background processing: at most max_workers jobs run at once and at most
+    # max_pending wait behind them; anything beyond that is rejected so callers can back off.
+    def __init__(self, worker, max_workers=4, max_pending=16, result_ttl=600):
+        self.worker = worker
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis")
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._avg_duration = 5.0
+
+    def submit(self, payload):
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull(self.retry_after())
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._purge_expired()
+            self._jobs[job_id] = {"id": job_id, "status": "queued", "created_at": time.time()}
+        self._executor.submit(self._run, job_id, payload)
+        return job_id
+
+    def _run(self, job_id, payload):
+        started = time.time()
+        self._update(job_id, status="running", started_at=started)
+        try:
+            result = self.worker(payload)
+            if isinstance(result, dict) and "error" in result:
+                self._update(job_id, status="failed", error=result["error"])
+            else:
+                self._update(job_id, status="done", result=result)
+        except Exception as e:
+            self._update(job_id, status="failed", error=str(e))
+        finally:
+            finished = time.time()
+            self._update(job_id, finished_at=finished)
+            with self._lock:
+                # Moving average of job time, used for Retry-After hints
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * (finished - started)
+            self._slots.release()
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [j for j, job in self._jobs.items() if job.get("finished_at", time.time()) < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def depth(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+
+    def retry_after(self):
+        # Seconds until roughly one worker's worth of the backlog has drained
+        waves = max(1, self.depth()) / self.max_workers
+        return max(1, math.ceil(self._avg_duration * waves))
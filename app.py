@@ -1,15 +1,22 @@
 import streamlit as st
 import json
 import os
-from groq import Groq
 from dotenv import load_dotenv
 import hashlib
-from pytrends.request import TrendReq
-import pandas as pd
-import requests
-import io
-from PIL import Image
-from streamlit_mic_recorder import speech_to_text
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import storage
+import history_log
+import history_search
+import response_cache
+import groq_client
+import metrics
+import persistence
+import prompts
+import chat_context
+import style_guide
+import sustainability
+import outfit_combinator
 
 # Load environment variables
 load_dotenv()
@@ -22,8 +29,17 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-DATA_FILE = "data.json"
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Render chat and Studio answers token by token as they are generated
+STREAM_RESPONSES = os.getenv("STYLESENSE_STREAMING", "1") == "1"
+# Wardrobe items shown per category page; larger closets are paged, never rendered whole
+WARDROBE_PAGE_SIZE = int(os.getenv("WARDROBE_PAGE_SIZE", 10))
+WARDROBE_CATEGORIES = ["Top", "Bottom", "Dress", "Outerwear", "Shoes", "Accessory"]
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 20))
+# Usernames that see the Metrics page (comma-separated)
+ADMIN_USERS = {u.strip() for u in os.getenv("STYLESENSE_ADMINS", "").split(",") if u.strip()}
+# Shared, pooled Groq client; optionally open its first connection now (GROQ_WARMUP=1)
+groq_client.warm_up_once()
 
 # --- Custom CSS for Premium UI ---
 st.markdown("""
@@ -237,19 +253,7 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- Data Management Functions ---
-def load_data():
-    if not os.path.exists(DATA_FILE):
-        return {"users": {}, "history": []}
-    try:
-        with open(DATA_FILE, "r") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return {"users": {}, "history": []}
-
-def save_data(data):
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=4)
-
+# Users, profiles, wardrobes and history are persisted by storage.py (indexed SQLite)
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
@@ -257,149 +261,137 @@ def verify_password(stored_password, provided_password):
     return stored_password == hash_password(provided_password)
 
 # --- AI Generation Function ---
-def generate_style_content(topic, platform, language, style_context, mood, weather, user_profile):
+def style_content_cache_key(topic, platform, language, style_context, mood, weather, user_profile, model):
+    return response_cache.make_key(
+        "style_content",
+        model=model,
+        topic=response_cache.normalize_text(topic),
+        platform=platform,
+        language=language,
+        style_context=sorted(response_cache.normalize_text(s) for s in style_context.split(",") if s.strip()),
+        mood=mood,
+        weather=weather,
+        profile={k: user_profile.get(k) for k in ("body_type", "skin_tone", "gender")},
+    )
+
+def build_style_prompt(topic, platform, language, style_context, mood, weather, user_profile):
+    return prompts.STUDIO.render(
+        topic=topic, platform=platform, language=language, mood=mood, weather=weather, style_context=style_context,
+        body_type=user_profile.get('body_type', 'Not specified'),
+        skin_tone=user_profile.get('skin_tone', 'Not specified'),
+        gender=user_profile.get('gender', 'Not specified'),
+    )
+
+def cached_style_content(topic, platform, language, style_context, mood, weather, user_profile, model="llama-3.3-70b-versatile"):
+    # Provider unhealthy: an earlier answer for the same request beats an error, even on "Regenerate"
+    cache = response_cache.get_cache("style_content")
+    return cache.get(style_content_cache_key(topic, platform, language, style_context, mood, weather, user_profile, model))
+
+def generate_style_content(topic, platform, language, style_context, mood, weather, user_profile, use_cache=True, stream=False):
+    # With stream=True an iterable of text chunks is returned instead of the full string
     if not GROQ_API_KEY:
-        return "⚠️ Error: Groq API Key not found. Please check your .env file."
-    
-    client = Groq(api_key=GROQ_API_KEY)
+        error = "⚠️ Error: Groq API Key not found. Please check your .env file."
+        return [error] if stream else error
     
     model = "llama-3.3-70b-versatile"
     
-    prompt = f"""
-    You are StyleSense, an expert AI Fashion Stylist and Content Creator.
-    
-    Goal: Generate engaging, trendy, and platform-specific fashion content based on the user's request and profile.
+    cache = response_cache.get_cache("style_content")
+    cache_key = style_content_cache_key(topic, platform, language, style_context, mood, weather, user_profile, model)
+    if use_cache:
+        cached = cache.get(cache_key)
+        metrics.record_cache("studio", cached is not None)
+        if cached is not None:
+            return [cached] if stream else cached
     
-    Request Details:
-    - Topic: {topic}
-    - Platform: {platform}
-    - Language: {language}
-    - Mood: {mood}
-    - Weather: {weather}
-    - Style Vibes: {style_context}
+    prompt = build_style_prompt(topic, platform, language, style_context, mood, weather, user_profile)
+    messages = [
+        {
+            "role": "user",
+            "content": prompt,
+        }
+    ]
     
-    User Profile:
-    - Body Type: {user_profile.get('body_type', 'Not specified')}
-    - Skin Tone: {user_profile.get('skin_tone', 'Not specified')}
-    - Gender Preference: {user_profile.get('gender', 'Not specified')}
-    
-    Guidelines:
-    - Tone: Stylish, confident, inclusive, and helpful.
-    - {platform} specific optimizations (e.g., hashtags for Instagram, concise constraints for Twitter).
-    - If the platform is Instagram, suggest a caption, a visual description of the outfit/photo, and relevant hashtags.
-    - If the platform is Twitter, keep it punchy and thread-like if needed.
-    - If the platform is WhatsApp, make it personal and shareable.
-    - Suggest outfits that flatter the specific body type and skin tone mentioned.
-    - Consider the weather and mood in the recommendation.
-    """
+    if stream:
+        # "Regenerate" still refreshes the cache with the new answer
+        return groq_client.stream_completion(
+            on_complete=lambda content: cache.set(cache_key, content),
+            call_site="studio",
+            messages=messages,
+            model=model,
+            temperature=0.7,
+        )
     
     try:
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt,
-                }
-            ],
+        chat_completion = groq_client.chat_completion(
+            call_site="studio",
+            messages=messages,
             model=model,
             temperature=0.7,
         )
-        return chat_completion.choices[0].message.content
+        content = chat_completion.choices[0].message.content
+        # "Regenerate" still refreshes the cache with the new answer
+        cache.set(cache_key, content)
+        return content
     except Exception as e:
+        cached = cached_style_content(topic, platform, language, style_context, mood, weather, user_profile, model)
+        if cached is not None:
+            return cached
         return f"⚠️ Error generating content: {str(e)}"
     
 def get_sustainability_score(item_description):
-    if not GROQ_API_KEY:
-        return "⚠️ API Key missing"
-    
-    client = Groq(api_key=GROQ_API_KEY)
-    
-    prompt = f"""
-    Analyze the sustainability of this fashion item: "{item_description}".
-    
-    Return ONLY a JSON object with:
-    - "score": (1-10 integer, 10 being most eco-friendly)
-    - "reason": (Short 1 sentence explanation)
-    - "tips": (Short 1 sentence tip to make it more sustainable)
-    
-    Do not add markdown formatting. Just the JSON string.
-    """
-    
+    # Material lexicon answers confident cases instantly; only ambiguous items reach the LLM.
+    # Returns None when the text does not describe an item at all.
     try:
-        completion = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="llama-3.3-70b-versatile",
-            temperature=0.2,
-            response_format={"type": "json_object"}
-        )
-        return json.loads(completion.choices[0].message.content)
+        return sustainability.score_item(item_description, use_llm=bool(GROQ_API_KEY))
     except Exception as e:
         return {"score": 5, "reason": "Could not analyze", "tips": "Check materials manualy."}
 
 def get_trend_data(keywords):
+    # Served from the on-disk trend store; returns (data, freshness metadata)
     try:
-        pytrends = TrendReq(hl='en-US', tz=360)
-        pytrends.build_payload(keywords, cat=0, timeframe='today 12-m', geo='', gprop='')
-        data = pytrends.interest_over_time()
-        return data
+        import trend_store  # pandas, numpy and pytrends: only the Style Guide page needs them
+        return trend_store.get_series(keywords)
     except Exception as e:
-        return None
+        return None, None
 
 def analyze_trends(trend_data_str):
     if not GROQ_API_KEY: return "Error: No API Key"
-    client = Groq(api_key=GROQ_API_KEY)
-    prompt = f"Analyze this fashion trend data trend: '{trend_data_str}'. Predict if it's rising or falling and give one strategy to wear it."
+    prompt = prompts.TRENDS.render(trend_data=trend_data_str)
     
-    completion = client.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
-        model="llama-3.3-70b-versatile",
-    )
-    return completion.choices[0].message.content
+    try:
+        completion = groq_client.chat_completion(
+            call_site="trends",
+            messages=[{"role": "user", "content": prompt}],
+            model="llama-3.3-70b-versatile",
+        )
+        return completion.choices[0].message.content
+    except Exception as e:
+        return f"AI insight is unavailable right now ({str(e)}). The chart above is still live data."
 
 import base64
 
 def encode_image(image_file):
-    return base64.b64encode(image_file.getvalue()).decode('utf-8')
+    # Decode, orient, downscale and re-encode before base64 so the vision payload stays small
+    import image_prep  # OpenCV loads with the Smart Mirror page, not at startup
+    return image_prep.to_base64(image_prep.prepare_for_vision(image_file.getvalue()))
 
 def analyze_image_with_vision(image_base64):
     if not GROQ_API_KEY:
         return None
     
-    client = Groq(api_key=GROQ_API_KEY)
-    
-    prompt = """
-    You are a professional fashion stylist and image consultant. Analyze this image deeply.
+    # Same (or re-encoded / resized) photo analyzed before: no network round trip
+    import vision_cache
+    image_bytes = base64.b64decode(image_base64)
+    cached = vision_cache.lookup(image_bytes)
+    metrics.record_cache("smart_mirror", cached is not None)
+    if cached is not None:
+        return cached
     
-    1. Identify the person's features:
-       - Estimated Skin Tone (e.g., Warm, Cool, Olive, Fair, Deep)
-       - Body Shape/Type (if visible)
-       - Facial Features/Vibe
-       
-    2. Analyze the context/outfit (if present):
-       - Current Style
-       - Colors worn
-       - Occasion fit
-       
-    3. PROVIDE STYLING ADVICE:
-       - "What to Wear": Suggest 3 specific outfit ideas that would perfectly suit this person's features.
-       - "Why it Suits": Explain WHY these colors, cuts, and styles work for their specific skin tone and body type.
-       
-    4. ADDITIONAL ANALYSIS:
-       - "Style Score": Rate the outfit/look on a scale of 0-100 based on coordination, fit, and trendiness.
-       - "Mood & Vibe": Describe the mood (e.g., "Confident & Edgy", "Relaxed Boho").
-       - "Colors & Patterns": Analyze the color palette and any patterns used.
-       
-    Format the output as JSON with keys: 
-    "features", 
-    "outfit_ideas" (list of strings), 
-    "why_it_suits" (string), 
-    "style_score" (integer 0-100),
-    "mood_analysis" (string),
-    "color_pattern_analysis" (string).
-    """
+    prompt = prompts.VISION.render()
     
     try:
-        chat_completion = client.chat.completions.create(
+        chat_completion = groq_client.chat_completion(
+            call_site="smart_mirror",
             messages=[
                 {
                     "role": "user",
@@ -418,7 +410,9 @@ def analyze_image_with_vision(image_base64):
             temperature=0.7,
             response_format={"type": "json_object"}
         )
-        return json.loads(chat_completion.choices[0].message.content)
+        result = json.loads(chat_completion.choices[0].message.content)
+        vision_cache.store(image_bytes, result)
+        return result
     except Exception as e:
         print(f"VISION API ERROR: {str(e)}")
         return {"error": str(e)}
@@ -433,6 +427,7 @@ def generate_image(prompt):
     # Since we don't have a user HF token, we'll try without auth (often works for public models on EF)
     # or better, use a placeholder image if it fails.
     try:
+        import requests
         response = requests.post(API_URL, json={"inputs": prompt})
         if response.status_code == 200:
             return response.content
@@ -451,6 +446,11 @@ if 'profile' not in st.session_state:
     st.session_state['profile'] = {"body_type": "Hourglass", "skin_tone": "Warm", "gender": "Female"}
 
 # --- Navigation ---
+def voice_input(**kwargs):
+    # The mic recorder component is only imported by the pages that show it
+    from streamlit_mic_recorder import speech_to_text
+    return speech_to_text(**kwargs)
+
 def navigate_to(page):
     st.session_state['page'] = page
     st.rerun()
@@ -537,10 +537,9 @@ def login_page():
         password = st.text_input("Password", type="password")
         
         if st.button("Login", use_container_width=True):
-            data = load_data()
-            users = data.get("users", {})
+            user = storage.get_user(username)
             
-            if username in users and verify_password(users[username]["password"], password):
+            if user and verify_password(user["password"], password):
                 st.session_state['user'] = username
                 st.success("Logged in successfully!")
                 navigate_to("Home")
@@ -565,32 +564,27 @@ def signup_page():
         confirm_password = st.text_input("Confirm Password", type="password")
         
         st.markdown("### Create Your Style Profile")
-        body_type = st.selectbox("Body Type", ["Hourglass", "Pear", "Apple", "Rectangle", "Inverted Triangle", "Athletic"])
-        skin_tone = st.selectbox("Skin Tone / Undertone", ["Warm", "Cool", "Neutral", "Olive", "Deep"])
-        gender = st.selectbox("Preferred Styling", ["Female", "Male", "Unisex"])
+        body_type = st.selectbox("Body Type", style_guide.BODY_TYPES)
+        skin_tone = st.selectbox("Skin Tone / Undertone", style_guide.SKIN_TONES)
+        gender = st.selectbox("Preferred Styling", style_guide.GENDERS)
         
         if st.button("Create Account", use_container_width=True):
             if new_password != confirm_password:
                 st.error("Passwords do not match")
                 return
                 
-            data = load_data()
-            if new_username in data["users"]:
+            profile = {
+                "body_type": body_type,
+                "skin_tone": skin_tone,
+                "gender": gender
+            }
+            if not storage.create_user(new_username, hash_password(new_password), profile):
                 st.error("Username already exists")
                 return
                 
-            data["users"][new_username] = {
-                "password": hash_password(new_password),
-                "profile": {
-                    "body_type": body_type,
-                    "skin_tone": skin_tone,
-                    "gender": gender
-                }
-            }
             # Auto-login context for session
-            st.session_state['profile'] = data["users"][new_username]["profile"]
+            st.session_state['profile'] = profile
             
-            save_data(data)
             st.success("Account created! Please log in.")
             navigate_to("Login")
 
@@ -598,6 +592,20 @@ def signup_page():
         if st.button("Back to Home", use_container_width=True):
             navigate_to("Home")
 
+def render_eco_card(slot, sus_score):
+    # Sustainability Badge (skipped when the topic is not an item)
+    if not sus_score:
+        return
+    score = sus_score.get('score', 5)
+    color = "#00b894" if score > 7 else "#fdcb6e" if score > 4 else "#d63031"
+    slot.markdown(f"""
+    <div class="glass-card" style="border-left: 8px solid {color};">
+        <h4>🌿 Eco-Score: {score}/10</h4>
+        <p><strong>Analysis:</strong> {sus_score.get('reason')}</p>
+        <p><em>Tip: {sus_score.get('tips')}</em></p>
+    </div>
+    """, unsafe_allow_html=True)
+
 def studio_page():
     st.markdown("<h1 class='hero-text'>Content Studio</h1>", unsafe_allow_html=True)
     st.markdown("<p class='subtitle'>Create magic with AI.</p>", unsafe_allow_html=True)
@@ -610,7 +618,7 @@ def studio_page():
         
         # Voice Input
         st.write("🎤 Voice Input:")
-        voice_text = speech_to_text(language='en', use_container_width=True, just_once=True, key='studio_mic')
+        voice_text = voice_input(language='en', use_container_width=True, just_once=True, key='studio_mic')
         
         default_topic = ""
         if voice_text:
@@ -635,6 +643,7 @@ def studio_page():
         weather = st.selectbox("Weather Context", ["Sunny & Hot", "Mild / Spring", "Rainy", "Cold / Snowy", "Windy", "Indoor / AC"])
     
         occasion = st.selectbox("Occasion", ["Casual", "Date Night", "Wedding Guest", "Job Interview", "Party", "Travel", "Gym/Athleisure", "Office"])
+        regenerate = st.checkbox("🔄 Regenerate (ignore saved suggestions)", value=False)
         st.markdown('</div>', unsafe_allow_html=True)
         
     if st.button("✨ Generate Magic"):
@@ -648,27 +657,50 @@ def studio_page():
                 # Combine topic with occasion for better context
                 full_topic = f"{topic} for {occasion}"
                 
-                result = generate_style_content(full_topic, platform, language, ", ".join(style_context), mood, weather, user_profile)
-                
-                # Calculate Sustainability Score if topic implies an item
-                sus_score = get_sustainability_score(topic)
-                
                 # Display Result
                 st.subheader("Your Content")
                 st.markdown("---")
+                eco_slot = st.empty()
+                suggestion_slot = st.empty()
                 
-                # Sustainability Badge
-                score = sus_score.get('score', 5)
-                color = "#00b894" if score > 7 else "#fdcb6e" if score > 4 else "#d63031"
-                st.markdown(f"""
-                <div class="glass-card" style="border-left: 8px solid {color};">
-                    <h4>🌿 Eco-Score: {score}/10</h4>
-                    <p><strong>Analysis:</strong> {sus_score.get('reason')}</p>
-                    <p><em>Tip: {sus_score.get('tips')}</em></p>
-                </div>
-                """, unsafe_allow_html=True)
+                content_args = (full_topic, platform, language, ", ".join(style_context), mood, weather, user_profile)
                 
-                st.markdown(f'<div class="glass-card"><h3>✨ A.I. Suggestion</h3>{result}</div>', unsafe_allow_html=True) 
+                # The content and the sustainability score are independent calls: run them side by side
+                # and fill each card as soon as its answer lands
+                with ThreadPoolExecutor(max_workers=2) as pool:
+                    # Calculate Sustainability Score if topic implies an item
+                    eco_task = pool.submit(get_sustainability_score, topic)
+                    eco_shown = False
+                    
+                    if STREAM_RESPONSES:
+                        stream = generate_style_content(*content_args, use_cache=not regenerate, stream=True)
+                        parts = []
+                        try:
+                            for chunk in stream:
+                                parts.append(chunk)
+                                suggestion_slot.markdown(f'<div class="glass-card"><h3>✨ A.I. Suggestion</h3>{"".join(parts)} ▌</div>', unsafe_allow_html=True)
+                                if not eco_shown and eco_task.done():
+                                    render_eco_card(eco_slot, eco_task.result())
+                                    eco_shown = True
+                            result = "".join(parts)
+                        except Exception as e:
+                            cached = cached_style_content(*content_args)
+                            result = cached if cached is not None else f"⚠️ Error generating content: {str(e)}"
+                        suggestion_slot.markdown(f'<div class="glass-card"><h3>✨ A.I. Suggestion</h3>{result}</div>', unsafe_allow_html=True)
+                        if getattr(stream, "time_to_first_token", None) is not None:
+                            st.caption(f"⚡ First words in {stream.time_to_first_token:.2f}s")
+                    else:
+                        content_task = pool.submit(generate_style_content, *content_args, use_cache=not regenerate)
+                        for future in as_completed([content_task, eco_task]):
+                            if future is eco_task:
+                                render_eco_card(eco_slot, future.result())
+                                eco_shown = True
+                            else:
+                                result = future.result()
+                                suggestion_slot.markdown(f'<div class="glass-card"><h3>✨ A.I. Suggestion</h3>{result}</div>', unsafe_allow_html=True)
+                    
+                    if not eco_shown:
+                        render_eco_card(eco_slot, eco_task.result())
                 
                 # Image Generation Option
                 if st.button("🎨 Visualize This Outfit"):
@@ -680,53 +712,30 @@ def studio_page():
                         else:
                             st.warning("Could not generate image. API busy or unauthorized.")
                 
-                # Save to History
-                data = load_data()
-                if "history" not in data:
-                    data["history"] = []
-                    
-                data["history"].append({
+                # Save to History (one appended record, nothing else is rewritten)
+                history_log.append({
                     "user": st.session_state['user'],
                     "topic": full_topic,
                     "platform": platform,
                     "language": language,
                     "content": result,
-                    "timestamp": "Just now" 
+                    "timestamp": history_log.now_timestamp()
                 })
-                save_data(data)
 
 def generate_static_advice(request_type, user_profile):
+    # Precomputed by `python style_guide.py` for every profile combination; live call only on a miss
+    stored = style_guide.lookup(request_type, user_profile)
+    metrics.record_cache("style_guide", stored is not None)
+    if stored is not None:
+        return stored
+    
     if not GROQ_API_KEY:
         return "⚠️ Please set API Key."
-    
-    client = Groq(api_key=GROQ_API_KEY)
-    model = "llama-3.3-70b-versatile"
-    
-    if request_type == "dos_donts":
-        prompt = f"""
-        Generate a concise list of 5 Fashion DOs and 5 Fashion DON'Ts specifically for:
-        Body Type: {user_profile.get('body_type')}
-        Skin Tone: {user_profile.get('skin_tone')}
-        Gender: {user_profile.get('gender')}
-        
-        Format as clear markdown bullet points. 
-        Focus on cuts, colors, and styling tricks.
-        """
-    elif request_type == "trends":
-        prompt = f"""
-        What are the top 3 current fashion trends suitable for:
-        Gender: {user_profile.get('gender')}
-        
-        Briefly explain each and why it works.
-        """
         
     try:
-        chat_completion = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model=model,
-            temperature=0.7,
-        )
-        return chat_completion.choices[0].message.content
+        advice = style_guide.generate_advice(request_type, user_profile)
+        style_guide.remember(request_type, user_profile, advice)
+        return advice
     except Exception as e:
         return f"Error: {str(e)}"
 
@@ -751,17 +760,25 @@ def style_guide_page():
     with tab2:
         st.markdown('<div class="glass-card"><h3>Current Trends for You</h3>', unsafe_allow_html=True)
         
+        # Precomputed per-gender trend picks, shown without any API call
+        trend_picks = style_guide.lookup("trends", user_profile)
+        if trend_picks:
+            st.markdown(trend_picks)
+        
         # Real Trend Input
         trend_kw = st.text_input("Analyze a Trend Keyword", "Oversized Blazer")
         
         if st.button("Analyze Trend Live", use_container_width=True):
             with st.spinner(f"Fetching data for {trend_kw}..."):
-                trend_data = get_trend_data([trend_kw])
+                trend_data, trend_meta = get_trend_data([trend_kw])
                 if trend_data is not None and not trend_data.empty:
-                    st.line_chart(trend_data[trend_kw], color="#6C5CE7")
+                    series = trend_data.iloc[:, 0]
+                    st.line_chart(series, color="#6C5CE7")
+                    fetched = datetime.fromtimestamp(trend_meta["fetched_at"]).strftime("%b %d, %H:%M")
+                    st.caption(f"Google Trends data as of {fetched}" + (" · refreshing in the background" if trend_meta["stale"] else ""))
                     
                     # AI Analysis
-                    analysis = analyze_trends(f"Trend: {trend_kw}, Last 5 values: {trend_data[trend_kw].tail().tolist()}")
+                    analysis = analyze_trends(f"Trend: {trend_kw}, Last 5 values: {series.tail().tolist()}")
                     st.success("Analysis Complete")
                     st.markdown(f"**AI Insight:** {analysis}")
                 else:
@@ -775,6 +792,9 @@ def chat_page():
     # Initialize chat history
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    # Rolling summary of turns that no longer fit the verbatim window
+    if "chat_context" not in st.session_state:
+        st.session_state.chat_context = {}
 
     # Display chat messages from history on app rerun
     for message in st.session_state.messages:
@@ -784,7 +804,7 @@ def chat_page():
     # Voice Input for Chat
     c1, c2 = st.columns([1, 8])
     with c1:
-        voice_chat_text = speech_to_text(language='en', start_prompt="🎤", stop_prompt="🛑", just_once=True, key='chat_mic')
+        voice_chat_text = voice_input(language='en', start_prompt="🎤", stop_prompt="🛑", just_once=True, key='chat_mic')
     
     prompt = st.chat_input("Ask for style advice...")
     
@@ -803,8 +823,6 @@ def chat_page():
 
         # Generate response
         try:
-            client = Groq(api_key=GROQ_API_KEY)
-            
             # Construct system prompt with context
             user_profile = st.session_state.get('profile', {})
             system_prompt = f"""You are StyleSense, an expert personal fashion stylist.
@@ -812,20 +830,34 @@ def chat_page():
             Context: The user is asking for real-time style advice. Be helpful, trendy, and concise.
             """
             
-            messages = [
-                {"role": "system", "content": system_prompt},
-            ] + st.session_state.messages
-            
-            chat_completion = client.chat.completions.create(
-                messages=messages,
-                model="llama-3.3-70b-versatile",
-                temperature=0.7,
-            )
-            response = chat_completion.choices[0].message.content
+            # Last N turns verbatim, older ones as a cached summary, all within the token budget
+            messages = chat_context.build_messages(system_prompt, st.session_state.messages, st.session_state.chat_context)
             
-            # Display assistant response in chat message container
-            with st.chat_message("assistant"):
-                st.markdown(response)
+            if STREAM_RESPONSES:
+                # Display assistant response in chat message container, token by token
+                stream = groq_client.stream_completion(
+                    call_site="chat",
+                    messages=messages,
+                    model="llama-3.3-70b-versatile",
+                    temperature=0.7,
+                )
+                with st.chat_message("assistant"):
+                    st.write_stream(stream)
+                    if stream.time_to_first_token is not None:
+                        st.caption(f"⚡ First words in {stream.time_to_first_token:.2f}s")
+                response = stream.text
+            else:
+                chat_completion = groq_client.chat_completion(
+                    call_site="chat",
+                    messages=messages,
+                    model="llama-3.3-70b-versatile",
+                    temperature=0.7,
+                )
+                response = chat_completion.choices[0].message.content
+                
+                # Display assistant response in chat message container
+                with st.chat_message("assistant"):
+                    st.markdown(response)
             # Add assistant response to chat history
             st.session_state.messages.append({"role": "assistant", "content": response})
             
@@ -835,15 +867,31 @@ def chat_page():
 def history_page():
     st.markdown("<h1 class='hero-text'>Style History</h1>", unsafe_allow_html=True)
     
-    data = load_data()
-    # Safely get history for user
-    all_history = data.get("history", [])
-    user_history = [h for h in all_history if h.get("user") == st.session_state['user']]
+    user = st.session_state['user']
+    if not history_log.count_for_user(user):
+        st.info("No style history yet. Go to the Studio to generate some looks!")
+        return
+    
+    query = st.text_input("🔎 Search your history", placeholder="e.g. linen, wedding, street style")
+    if query != st.session_state.get('history_query'):
+        st.session_state['history_query'] = query
+        st.session_state['history_page'] = 0
+    page = st.session_state.get('history_page', 0)
+    offset = page * HISTORY_PAGE_SIZE
+    
+    # Only the visible page is read: from the full-text index when searching, else by offset
+    if query.strip():
+        user_history, total = history_search.search(user, query, HISTORY_PAGE_SIZE, offset)
+    else:
+        total = history_log.count_for_user(user)
+        user_history = history_log.read_user(user, limit=HISTORY_PAGE_SIZE, newest_first=True, offset=offset)
     
     if not user_history:
-        st.info("No style history yet. Go to the Studio to generate some looks!")
+        st.info("No history matches your search.")
     else:
-        for item in reversed(user_history):
+        pages = (total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+        st.caption(f"{total} entries · page {page + 1} of {pages}")
+        for item in user_history:
             with st.expander(f"📅 {item.get('topic', 'Unknown Topic')} - {item.get('platform', 'Platform')}"):
                 st.markdown(f"""
                 <div class="glass-card">
@@ -852,19 +900,45 @@ def history_page():
                     {item.get('content')}
                 </div>
                 """, unsafe_allow_html=True)
+        
+        c_prev, _, c_next = st.columns([1, 3, 1])
+        if c_prev.button("← Newer", disabled=page == 0, use_container_width=True):
+            st.session_state['history_page'] = page - 1
+            st.rerun()
+        if c_next.button("Older →", disabled=page >= pages - 1, use_container_width=True):
+            st.session_state['history_page'] = page + 1
+            st.rerun()
 
-def wardrobe_page():
-    st.markdown("<h1 class='hero-text'>Digital Wardrobe</h1>", unsafe_allow_html=True)
+def render_wardrobe_category(user, cat, count):
+    # Newest first, one page at a time; only this page's rows are read from the database
+    pages = (count + WARDROBE_PAGE_SIZE - 1) // WARDROBE_PAGE_SIZE
+    page_key = f"wardrobe_page_{cat}"
+    page = min(st.session_state.get(page_key, 0), pages - 1)
     
-    data = load_data()
-    user_data = data["users"].get(st.session_state['user'], {})
+    for entry in storage.get_wardrobe_page(user, cat, page, WARDROBE_PAGE_SIZE):
+        c_item, c_remove = st.columns([5, 1])
+        c_item.markdown(f"- {entry['item']}")
+        if c_remove.button("✕", key=f"remove_item_{entry['id']}", help="Remove from wardrobe"):
+            storage.remove_wardrobe_item(user, entry['id'])
+            st.rerun()
     
-    if "wardrobe" not in user_data:
-        user_data["wardrobe"] = []
-        data["users"][st.session_state['user']] = user_data
-        save_data(data)
+    if pages > 1:
+        c_prev, c_info, c_next = st.columns([1, 2, 1])
+        if c_prev.button("‹", key=f"{page_key}_prev", disabled=page == 0):
+            st.session_state[page_key] = page - 1
+            st.rerun()
+        c_info.caption(f"Page {page + 1} of {pages}")
+        if c_next.button("›", key=f"{page_key}_next", disabled=page >= pages - 1):
+            st.session_state[page_key] = page + 1
+            st.rerun()
+
+def wardrobe_page():
+    st.markdown("<h1 class='hero-text'>Digital Wardrobe</h1>", unsafe_allow_html=True)
     
-    wardrobe = user_data["wardrobe"]
+    user = st.session_state['user']
+    # Running per-category counts; the item list itself is only paged in per category
+    cat_counts = storage.get_wardrobe_counts(user)
+    total_items = sum(cat_counts.values())
     
     # --- Add Item Section ---
     st.markdown('<div class="glass-card">', unsafe_allow_html=True)
@@ -877,11 +951,7 @@ def wardrobe_page():
             
         if st.button("Add to Wardrobe", use_container_width=True):
             if item_name:
-                new_item = {"item": item_name, "category": category}
-                wardrobe.append(new_item)
-                user_data["wardrobe"] = wardrobe
-                data["users"][st.session_state['user']] = user_data
-                save_data(data)
+                storage.add_wardrobe_item(user, item_name, category)
                 st.success(f"Added {item_name}!")
                 st.rerun()
             else:
@@ -889,50 +959,56 @@ def wardrobe_page():
     st.markdown('</div>', unsafe_allow_html=True)
 
     # --- Analytics Section ---
-    if wardrobe:
+    if total_items:
         st.markdown('<div class="glass-card">', unsafe_allow_html=True)
         st.markdown("### 📊 Wardrobe Analysis")
         
-        # Calculate stats
-        total_items = len(wardrobe)
-        categories = ["Top", "Bottom", "Dress", "Outerwear", "Shoes", "Accessory"]
-        cat_counts = {cat: 0 for cat in categories}
-        for item in wardrobe:
-            if item['category'] in cat_counts:
-                cat_counts[item['category']] += 1
+        chart_counts = {cat: cat_counts.get(cat, 0) for cat in WARDROBE_CATEGORIES}
         
         c1, c2 = st.columns([1, 2])
         with c1:
             st.metric("Total Items", total_items, "+1 this week")
-            st.caption("Most popular: " + max(cat_counts, key=cat_counts.get))
+            st.caption("Most popular: " + max(chart_counts, key=chart_counts.get))
             
         with c2:
-            st.bar_chart(cat_counts, height=200, color="#6C5CE7")
+            st.bar_chart(chart_counts, height=200, color="#6C5CE7")
+        
+        # Whole-closet eco scoring: lexicon first, one batched AI request for the rest
+        if st.button("🌿 Score My Wardrobe's Sustainability", use_container_width=True):
+            with st.spinner("Checking materials..."):
+                try:
+                    scores = sustainability.score_items([i['item'] for i in storage.get_wardrobe(user)])
+                except Exception as e:
+                    scores = {}
+                    st.error(f"AI Error: {e}")
+                for item_name, res in scores.items():
+                    if res:
+                        st.markdown(f"- **{item_name}**: 🌿 {res.get('score')}/10 — {res.get('reason')} _{res.get('tips')}_")
+                    else:
+                        st.markdown(f"- **{item_name}**: could not score")
             
         st.markdown('</div>', unsafe_allow_html=True)
 
     # --- View Wardrobe ---
-    if not wardrobe:
+    if not total_items:
         st.info("Your wardrobe is empty. Add some items above!")
     else:
         st.markdown("### Your Collection")
-        categories = ["Top", "Bottom", "Dress", "Outerwear", "Shoes", "Accessory"]
         
         # Create rows of 3 columns
         cols = st.columns(3)
-        for idx, cat in enumerate(categories):
+        for idx, cat in enumerate(WARDROBE_CATEGORIES):
             col_idx = idx % 3
             with cols[col_idx]:
+                count = cat_counts.get(cat, 0)
                 st.markdown(f"""
                 <div class="glass-card" style="padding: 15px;">
-                    <h4 style="margin:0;">{cat}</h4>
+                    <h4 style="margin:0;">{cat} <small>({count})</small></h4>
                     <hr style="margin: 10px 0;">
                 """, unsafe_allow_html=True)
                 
-                items = [i['item'] for i in wardrobe if i['category'] == cat]
-                if items:
-                    for i in items:
-                        st.markdown(f"- {i}")
+                if count:
+                    render_wardrobe_category(user, cat, count)
                 else:
                     st.caption("No items")
                 st.markdown("</div>", unsafe_allow_html=True)
@@ -945,19 +1021,32 @@ def wardrobe_page():
     occasion_mix = st.selectbox("Outfit Occasion", ["Weekend Casual", "Work/Office", "Date Night", "Party"])
     
     if st.button("Create Outfit from My Wardrobe", use_container_width=True):
-        if not wardrobe:
+        if not total_items:
             st.error("Add items to your wardrobe first!")
         else:
             with st.spinner("Rummaging through your closet..."):
-                wardrobe_text = ", ".join([f"{i['item']} ({i['category']})" for i in wardrobe])
+                wardrobe = storage.get_wardrobe(user)
+                # Outfits are assembled and ranked locally; the model only styles the shortlist
+                candidates = outfit_combinator.combine(wardrobe, occasion_mix)
+                missing = outfit_combinator.missing_basics(wardrobe)
                 user_profile = st.session_state.get('profile', {})
                 
-                prompt = f"Act as a personal stylist. User Profile: {user_profile} Occasion: {occasion_mix} Available Wardrobe: {wardrobe_text} Task: Create a complete outfit using ONLY the items from the available wardrobe if possible. If a key piece is missing, suggest what to buy to complete the look. Explain why this outfit works for the occasion."
+                if candidates:
+                    prompt = prompts.MIX_MATCH.render(
+                        user_profile=user_profile, occasion=occasion_mix,
+                        shortlist=outfit_combinator.describe(candidates), missing=', '.join(missing) or 'none',
+                    )
+                else:
+                    # Nothing can be combined yet: newest pieces first, as many as the prompt budget allows
+                    sample = ", ".join(f"{i['item']} ({i['category']})" for i in reversed(wardrobe))
+                    prompt = prompts.MIX_MATCH_SAMPLE.render(
+                        user_profile=user_profile, occasion=occasion_mix, sample=sample, missing=', '.join(missing) or 'none',
+                    )
                 
                 if GROQ_API_KEY:
                     try:
-                        client = Groq(api_key=GROQ_API_KEY)
-                        chat_completion = client.chat.completions.create(
+                        chat_completion = groq_client.chat_completion(
+                            call_site="mix_match",
                             messages=[{"role": "user", "content": prompt}],
                             model="llama-3.3-70b-versatile",
                             temperature=0.7,
@@ -991,9 +1080,11 @@ def smart_mirror_page():
         if uploaded_file:
             if st.button("✨ Analyze My Style", use_container_width=True):
                 with st.spinner("Scanning features & consulting stylists..."):
-                    # Encode and Analyze
-                    base64_img = encode_image(uploaded_file)
-                    analysis = analyze_image_with_vision(base64_img)
+                    # Encode and Analyze; an image that does not decode is never sent
+                    try:
+                        analysis = analyze_image_with_vision(encode_image(uploaded_file))
+                    except ValueError as e:
+                        analysis = {"error": str(e)}
                     
                     if analysis and "error" not in analysis:
                         st.session_state['mirror_result'] = analysis
@@ -1055,6 +1146,64 @@ def smart_mirror_page():
             
         st.markdown('</div>', unsafe_allow_html=True)
 
+def metrics_page():
+    st.markdown("<h1 class='hero-text'>AI Call Metrics</h1>", unsafe_allow_html=True)
+    st.markdown("<p class='subtitle'>Groq usage by call site since this server started. The Flask API exposes its own at /metrics.</p>", unsafe_allow_html=True)
+    
+    snapshot = metrics.summary()
+    calls = snapshot["calls"]
+    
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Calls", sum(r["calls"] for r in calls))
+    c2.metric("Errors", sum(r["errors"] for r in calls))
+    c3.metric("Tokens", sum(r["prompt_tokens"] + r["completion_tokens"] for r in calls))
+    c4.metric("Circuit Breaker", groq_client.breaker.state)
+    
+    if not calls:
+        st.info("No AI calls yet in this process.")
+    else:
+        st.markdown("### By Call Site")
+        # Slowest total first: where the time actually goes
+        st.dataframe(sorted(calls, key=lambda r: -r["total_latency_s"]), use_container_width=True, hide_index=True)
+        st.bar_chart({r["call_site"]: r["prompt_tokens"] + r["completion_tokens"] for r in calls}, height=220, color="#6C5CE7")
+    
+    if snapshot["errors"]:
+        st.markdown("### Errors")
+        st.dataframe(snapshot["errors"], use_container_width=True, hide_index=True)
+    
+    if snapshot["cache"]:
+        st.markdown("### Cache Hits")
+        st.dataframe(
+            [{"call_site": site, **counts, "hit_rate": round(counts["hit"] / max(1, counts["hit"] + counts["miss"]), 3)}
+             for site, counts in sorted(snapshot["cache"].items())],
+            use_container_width=True, hide_index=True,
+        )
+    
+    st.markdown("### Prompt Budgets")
+    if snapshot["overruns"]:
+        st.dataframe(snapshot["overruns"], use_container_width=True, hide_index=True)
+    st.dataframe(prompts.template_report(), use_container_width=True, hide_index=True)
+    
+    st.markdown("### Caches")
+    import vision_cache  # loads PIL; only the Smart Mirror and this page need it
+    rows = [{"cache": f"response: {name}", **{k: counts[k] for k in ("hits", "misses", "entries")},
+             "hit_rate": round(counts["hit_rate"], 3)} for name, counts in response_cache.stats().items()]
+    for name, counts in (("vision", vision_cache.stats()), ("storage reads", storage.read_cache_stats())):
+        lookups = counts["hits"] + counts["misses"]
+        rows.append({"cache": name, "hits": counts["hits"], "misses": counts["misses"], "entries": counts.get("entries"),
+                     "hit_rate": round(counts["hits"] / lookups, 3) if lookups else 0.0})
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+    
+    # Write-behind buffer for trend metadata (only this process writes through it; Flask does not)
+    persist = persistence.stats()
+    st.markdown("### File Persistence")
+    p1, p2, p3, p4 = st.columns(4)
+    p1.metric("Pending Writes", persist["pending"])
+    p2.metric("Coalescing Ratio", f"{persist['coalescing_ratio']:.1f}x" if persist["coalescing_ratio"] else "-")
+    p3.metric("Avg Flush", f"{persist['avg_flush_seconds'] * 1000:.1f} ms" if persist["avg_flush_seconds"] is not None else "-")
+    p4.metric("Max Flush", f"{persist['max_flush_seconds'] * 1000:.1f} ms")
+    st.caption(f"{persist['mutations']} updates, {persist['writes']} file writes in {persist['flushes']} flushes, {persist['failures']} failed")
+
 def main():
     # Sidebar
     with st.sidebar:
@@ -1087,6 +1236,8 @@ def main():
                 navigate_to("History")
             if st.button("📘 Guide", use_container_width=True):
                 navigate_to("Guide")
+            if st.session_state['user'] in ADMIN_USERS and st.button("📈 Metrics", use_container_width=True):
+                navigate_to("Metrics")
         else:
             st.info("Please Log In to access features.")
 
@@ -1127,6 +1278,11 @@ def main():
             style_guide_page()
         else:
             navigate_to("Login")
+    elif st.session_state['page'] == "Metrics":
+        if st.session_state['user'] in ADMIN_USERS:
+            metrics_page()
+        else:
+            navigate_to("Home")
             
     # Footer
     st.markdown("""
@@ -0,0 +1,279 @@
+import argparse
+import io
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+# Offline benchmark suite: every model call goes to benchmarks/stub_groq.py on localhost, so runs are
+# repeatable and free. Drives the same functions the app uses and reports latency percentiles,
+# throughput and peak memory per scenario.
+#
+#   python benchmarks/run.py
+#   python benchmarks/run.py --latency-ms 800 --error-rate 0.05 --concurrency 16 --json results.json
+#   python benchmarks/run.py --only flask_analyze --requests 200
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stub_groq
+
+SCENARIOS = ["style_content", "style_content_stream", "sustainability", "vision", "chat", "flask_analyze"]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def peak_rss_mb():
+    # High-water mark of the whole process (KiB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_scenario(name, call, iterations, concurrency):
+    # call(i) performs one operation; returns optional extra measurements (e.g. time to first token)
+    latencies = []
+    extras = []
+    errors = []
+    lock = threading.Lock()
+
+    def one(i):
+        started = time.perf_counter()
+        try:
+            extra = call(i)
+        except Exception as e:
+            with lock:
+                errors.append(f"{type(e).__name__}: {e}")
+            return
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if extra is not None:
+                extras.append(extra)
+
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(iterations)))
+    wall = time.perf_counter() - started
+
+    result = {
+        "scenario": name,
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "p50_ms": _ms(percentile(latencies, 50)),
+        "p95_ms": _ms(percentile(latencies, 95)),
+        "p99_ms": _ms(percentile(latencies, 99)),
+        "throughput_per_s": round(len(latencies) / wall, 2) if wall else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if tracemalloc.is_tracing():
+        result["peak_python_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+    if extras:
+        result["ttft_p50_ms"] = _ms(percentile(extras, 50))
+        result["ttft_p95_ms"] = _ms(percentile(extras, 95))
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def make_image(seed, size=(1280, 960)):
+    # Random photo-sized JPEGs, each different enough that the perceptual vision cache misses
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 255, (12, 16, 3), dtype=np.uint8)
+    img = Image.fromarray(coarse).resize(size, Image.BILINEAR)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+# --- Scenarios ---
+def style_content_call(app, stream):
+    profile = {"body_type": "Pear", "skin_tone": "Warm", "gender": "Female"}
+
+    def call(i):
+        # Unique topic and use_cache=False: measure the model path, not the response cache
+        result = app.generate_style_content(
+            f"Autumn layering look {i}", "Instagram", "English", "Minimalist, Smart casual", "Confident",
+            "Cold", profile, use_cache=False, stream=stream,
+        )
+        if not stream:
+            if isinstance(result, str) and result.startswith("Error"):
+                raise RuntimeError(result)
+            return None
+        for _ in result:
+            pass
+        return result.time_to_first_token
+    return call
+
+
+def sustainability_call(app):
+    def call(i):
+        # A garment with no known material always needs the model; unique names skip the memo
+        score = app.get_sustainability_score(f"benchmark shirt number {i} from brand {random.random():.6f}")
+        if score.get("reason") == "Could not analyze":
+            raise RuntimeError("sustainability fell back to the default score")
+    return call
+
+
+def vision_call(app, images):
+    import image_prep
+
+    def call(i):
+        encoded = image_prep.to_base64(image_prep.prepare_for_vision(images[i % len(images)]))
+        result = app.analyze_image_with_vision(encoded)
+        if not result or "error" in result:
+            raise RuntimeError((result or {}).get("error", "no result"))
+    return call
+
+
+def chat_call(turns):
+    import chat_context
+    import groq_client
+
+    def call(i):
+        # One conversation per iteration: every turn goes through context building and streaming
+        history, state, ttft = [], {}, []
+        for turn in range(turns):
+            history.append({"role": "user", "content": f"What should I wear to event {i}-{turn}?"})
+            messages = chat_context.build_messages("You are StyleSense, an expert personal fashion stylist.",
+                                                   history, state)
+            stream = groq_client.stream_completion(call_site="chat", messages=messages,
+                                                   model="llama-3.3-70b-versatile", temperature=0.7)
+            for _ in stream:
+                pass
+            ttft.append(stream.time_to_first_token)
+            history.append({"role": "assistant", "content": stream.text})
+        return statistics.mean(ttft)
+    return call
+
+
+def flask_analyze_call(images):
+    import requests
+    from werkzeug.serving import make_server
+
+    import flask_app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # one access-log line per request otherwise
+    server = make_server("127.0.0.1", 0, flask_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-flask", daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/analyze"
+    session = threading.local()
+
+    def call(i):
+        http = getattr(session, "http", None)
+        if http is None:
+            http = session.http = requests.Session()
+        response = http.post(url, files={"file": (f"look-{i}.jpg", images[i % len(images)], "image/jpeg")}, timeout=120)
+        body = response.json()
+        if response.status_code != 200 or "error" in body:
+            raise RuntimeError(f"HTTP {response.status_code}: {body.get('error')}")
+    return call, server
+
+
+def print_table(results):
+    columns = ["scenario", "iterations", "concurrency", "errors", "stub_requests", "p50_ms", "p95_ms", "p99_ms",
+               "throughput_per_s", "ttft_p50_ms", "peak_rss_mb", "peak_python_mb"]
+    widths = {c: max(len(c), *(len(str(r.get(c, "-"))) for r in results)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for r in results:
+        print("  ".join(str(r.get(c, "-") if r.get(c) is not None else "-").ljust(widths[c]) for c in columns))
+    for r in results:
+        if "first_error" in r:
+            print(f"{r['scenario']}: first error: {r['first_error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline StyleSense benchmarks against a local stub Groq server.")
+    parser.add_argument("--only", nargs="+", choices=SCENARIOS, help="run only these scenarios")
+    parser.add_argument("--iterations", type=int, default=20, help="operations per function scenario")
+    parser.add_argument("--requests", type=int, default=100, help="requests in the Flask /analyze load test")
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel callers per scenario")
+    parser.add_argument("--chat-turns", type=int, default=6, help="turns per chat conversation")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also report the Python heap peak per scenario (tracemalloc; slows every call down)")
+    for name, default in stub_groq.DEFAULTS.items():
+        parser.add_argument("--" + name.replace("_", "-"), type=type(default), default=default,
+                            help=f"stub server setting (default {default})")
+    args = parser.parse_args()
+    scenarios = args.only or SCENARIOS
+
+    server, stub = stub_groq.start(**{name: getattr(args, name) for name in stub_groq.DEFAULTS})
+    json_path = os.path.abspath(args.json) if args.json else None
+    workdir = tempfile.mkdtemp(prefix="stylesense-bench-")
+    os.chdir(workdir)  # databases and caches are created here, never in the real install
+    os.environ.update({
+        "GROQ_API_KEY": "stub",
+        "GROQ_BASE_URL": f"http://127.0.0.1:{server.server_address[1]}",
+        # The client-side limiter would otherwise be what gets measured
+        "GROQ_RPM": os.environ.get("GROQ_RPM", "100000"),
+        "GROQ_TPM": os.environ.get("GROQ_TPM", "100000000"),
+        "GROQ_WARMUP": "0",
+        "STREAMLIT_LOGGER_LEVEL": "error",
+    })
+
+    import app  # only after the environment points at the stub
+
+    # Separate seeds per scenario: photos the vision scenario analysed would be perceptual cache hits for /analyze
+    vision_images = [make_image(seed) for seed in range(args.iterations)]
+    flask_images = [make_image(seed) for seed in range(args.iterations, args.iterations + args.requests)]
+    if args.trace_memory:
+        tracemalloc.start()
+    results = []
+    for name in scenarios:
+        before = stub.requests
+        if name == "style_content":
+            results.append(run_scenario(name, style_content_call(app, False), args.iterations, args.concurrency))
+        elif name == "style_content_stream":
+            results.append(run_scenario(name, style_content_call(app, True), args.iterations, args.concurrency))
+        elif name == "sustainability":
+            results.append(run_scenario(name, sustainability_call(app), args.iterations, args.concurrency))
+        elif name == "vision":
+            results.append(run_scenario(name, vision_call(app, vision_images), args.iterations, args.concurrency))
+        elif name == "chat":
+            results.append(run_scenario(name, chat_call(args.chat_turns), args.iterations, args.concurrency))
+        elif name == "flask_analyze":
+            call, flask_server = flask_analyze_call(flask_images)
+            results.append(run_scenario(name, call, args.requests, args.concurrency))
+            flask_server.shutdown()
+        # Model calls that actually reached the stub; near zero means the scenario measured a cache
+        results[-1]["stub_requests"] = stub.requests - before
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+    print_table(results)
+    print(f"\nStub: {stub.requests} requests, {stub.errors} injected errors. peak_rss_mb is the process high-water mark so far.")
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump({"settings": stub.settings, "results": results}, f, indent=4)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Cold-start benchmark for app.py. Every sample runs in a fresh interpreter, the way a new Streamlit
+# server process or replica starts, and reports:
+#   - import time per top-level module (python -X importtime, cumulative)
+#   - time to first render of main() (the login page) through Streamlit's AppTest harness
+#   - heavy dependencies that were loaded even though the first page doesn't need them
+# Exits non-zero when the median first render is over budget or a heavy module is loaded eagerly.
+#
+#   python benchmarks/startup.py --runs 5 --budget-ms 1000
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+
+# Page-scoped dependencies: none of these should be imported just to show the login page
+HEAVY_MODULES = ["pandas", "numpy", "pytrends", "cv2", "PIL", "groq", "requests", "streamlit_mic_recorder"]
+
+DEFAULT_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", 1000))
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+framework = time.perf_counter() - started
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+started = time.perf_counter()
+at.run()
+first_render = time.perf_counter() - started
+print(json.dumps({
+    "framework": framework,
+    "first_render": first_render,
+    "exceptions": [str(e.value) for e in at.exception],
+    "modules": sorted(sys.modules),
+}))
+"""
+
+
+def parse_importtime(stderr):
+    # "import time: self [us] | cumulative | imported package"; nesting shows as leading spaces
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        name = parts[2]
+        if name.startswith("  "):  # only top-level imports; children are included in their parent
+            continue
+        modules[name.strip()] = int(parts[1]) / 1000.0
+    return modules
+
+
+def sample(env):
+    with tempfile.TemporaryDirectory() as workdir:
+        # Run from an empty directory so the benchmark never touches real databases or caches
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _PROBE, APP],
+            cwd=workdir, env=env, capture_output=True, text=True, timeout=300,
+        )
+    if result.returncode != 0:
+        raise RuntimeError(f"startup probe failed:\n{result.stderr[-2000:]}")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["imports"] = parse_importtime(result.stderr)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app.py cold start and check it against a budget.")
+    parser.add_argument("--runs", type=int, default=3, help="fresh-process samples to take")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="fail when the median first render is slower than this")
+    parser.add_argument("--top", type=int, default=15, help="modules to list in the import table")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""), GROQ_WARMUP="0")
+    runs = [sample(env) for _ in range(args.runs)]
+
+    imports = {}
+    for run in runs:
+        for name, ms in run["imports"].items():
+            imports.setdefault(name, []).append(ms)
+    print(f"Top-level imports (median of {args.runs} runs, cumulative ms):")
+    ranked = sorted(((statistics.median(v), name) for name, v in imports.items()), reverse=True)
+    for ms, name in ranked[:args.top]:
+        print(f"  {ms:9.1f}  {name}")
+
+    framework_ms = statistics.median(r["framework"] for r in runs) * 1000
+    render_ms = statistics.median(r["first_render"] for r in runs) * 1000
+    print(f"\nStreamlit test harness import: {framework_ms:.0f} ms")
+    print(f"Time to first render of main(): {render_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+
+    failures = []
+    if render_ms > args.budget_ms:
+        failures.append(f"first render {render_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    eager = sorted({m for r in runs for m in HEAVY_MODULES if m in r["modules"]})
+    if eager:
+        failures.append("loaded before any page needed them: " + ", ".join(eager))
+    errors = sorted({e for r in runs for e in r["exceptions"]})
+    if errors:
+        failures.append("app raised: " + "; ".join(errors))
+
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    if not failures:
+        print("OK")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,172 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the Groq (OpenAI-compatible) API, so benchmarks never leave the machine.
+# Point the app at it with GROQ_BASE_URL=http://127.0.0.1:<port> and any GROQ_API_KEY.
+#
+#   latency_ms         time before the first byte (time to first token when streaming)
+#   jitter_ms          +/- uniform noise on that latency
+#   tokens_per_second  generation speed; a completion of N tokens takes N / rate after the first one
+#   completion_tokens  length of every plain-text answer
+#   error_rate         fraction of requests answered with error_status instead
+#   error_status       429 (with Retry-After) or any 5xx
+
+DEFAULTS = {
+    "latency_ms": 300.0,
+    "jitter_ms": 50.0,
+    "tokens_per_second": 250.0,
+    "completion_tokens": 200,
+    "error_rate": 0.0,
+    "error_status": 503,
+}
+
+FILLER = ("Pair a crisp white shirt with high-waisted trousers and loafers for an effortless look that works "
+          "from desk to dinner, then add a structured blazer and gold jewellery to finish it. ").split()
+
+
+def _words(count):
+    return [FILLER[i % len(FILLER)] for i in range(count)]
+
+
+def _json_answer(body):
+    # One object that satisfies every JSON-mode caller: sustainability (single and batch) and vision
+    prompt = json.dumps(body.get("messages", []))
+    indexes = [int(n) for n in re.findall(r"\\n\s*(\d+)\. ", prompt)]
+    return {
+        "score": 6,
+        "reason": "Stub sustainability reason.",
+        "tips": "Stub sustainability tip.",
+        "items": [{"index": i, "score": 6, "reason": "Stub reason.", "tips": "Stub tip."} for i in indexes],
+        "features": "Warm skin tone, rectangle build",
+        "outfit_ideas": ["Camel coat over a cream knit", "Olive utility jacket with dark denim", "Rust midi dress"],
+        "why_it_suits": "Earthy warm colours echo the skin's undertone.",
+        "style_score": 82,
+        "mood_analysis": "Relaxed and confident",
+        "color_pattern_analysis": "Neutral palette, no pattern",
+    }
+
+
+class StubState:
+    def __init__(self, **settings):
+        self.settings = dict(DEFAULTS, **{k: v for k, v in settings.items() if v is not None})
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def count(self, error=False):
+        with self.lock:
+            self.requests += 1
+            self.errors += int(error)
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status, payload, headers=None):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            # groq_client.warm_up() lists models
+            if self.path.rstrip("/").endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            s = state.settings
+            time.sleep(max(0.0, s["latency_ms"] + random.uniform(-s["jitter_ms"], s["jitter_ms"])) / 1000.0)
+
+            if random.random() < s["error_rate"]:
+                state.count(error=True)
+                headers = {"Retry-After": "1"} if s["error_status"] == 429 else None
+                self._send_json(s["error_status"], {"error": {"message": "injected failure", "type": "stub"}}, headers)
+                return
+            state.count()
+
+            model = body.get("model", "stub")
+            json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+            if json_mode:
+                tokens = [json.dumps(_json_answer(body))]
+                completion_tokens = len(tokens[0]) // 4
+            else:
+                tokens = [w + " " for w in _words(int(s["completion_tokens"]))]
+                completion_tokens = len(tokens)
+            per_token = 1.0 / s["tokens_per_second"] if s["tokens_per_second"] > 0 else 0.0
+            usage = {"prompt_tokens": len(json.dumps(body.get("messages", []))) // 4,
+                     "completion_tokens": completion_tokens}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for i, token in enumerate(tokens):
+                    chunk = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": [{"index": 0, "delta": {"content": token},
+                                                          "finish_reason": None}]}
+                    if i:
+                        time.sleep(per_token)
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                done = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"usage": usage}}
+                self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                self.wfile.flush()
+                self.close_connection = True
+                return
+
+            time.sleep(per_token * max(0, completion_tokens - 1))
+            self._send_json(200, {
+                "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start(port=0, **settings):
+    # Serves in a background thread; returns (server, state). server.server_address has the real port.
+    state = StubState(**settings)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-groq", daemon=True).start()
+    return server, state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local Groq-compatible stub server.")
+    parser.add_argument("--port", type=int, default=8765)
+    for name, default in DEFAULTS.items():
+        parser.add_argument("--" + name.replace("_", "-"), type=type(default), default=default)
+    args = vars(parser.parse_args())
+    port = args.pop("port")
+    server, _ = start(port, **args)
+    print(f"Stub Groq API on http://127.0.0.1:{server.server_address[1]} (GROQ_BASE_URL)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
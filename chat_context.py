@@ -0,0 +1,96 @@
+import os
+
+import groq_client
+
+# How much of a conversation is sent with each chat request
+RECENT_TURNS = int(os.getenv("CHAT_RECENT_TURNS", 6))
+TOKEN_BUDGET = int(os.getenv("CHAT_TOKEN_BUDGET", 3000))
+SUMMARY_MODEL = os.getenv("CHAT_SUMMARY_MODEL", "llama-3.1-8b-instant")
+SUMMARY_MAX_TOKENS = 250
+
+
+def estimate_tokens(text):
+    # Llama tokenizers average roughly 4 characters per token for English text
+    return max(1, len(text) // 4) if text else 0
+
+
+def message_tokens(message):
+    return estimate_tokens(message["content"]) + 4
+
+
+def summarize(previous_summary, messages):
+    lines = [f"{m['role']}: {m['content']}" for m in messages]
+    prompt = (
+        "Update the running summary of a fashion-styling chat. Keep the user's preferences, constraints, "
+        "items they own or mentioned and advice already given. Max 120 words.\n\n"
+        f"Current summary: {previous_summary or '(none)'}\n\nNew turns:\n" + "\n".join(lines)
+    )
+    completion = groq_client.chat_completion(
+        call_site="chat_summary",
+        messages=[{"role": "user", "content": prompt}],
+        model=SUMMARY_MODEL,
+        temperature=0.2,
+        max_tokens=SUMMARY_MAX_TOKENS,
+    )
+    return completion.choices[0].message.content.strip()
+
+
+def _tokens(messages):
+    return sum(message_tokens(m) for m in messages)
+
+
+def _fold_point(pending, cut, target):
+    # Smallest cut (>= `cut`) that leaves at most `target` tokens verbatim; the newest message always stays
+    while cut < len(pending) - 1 and _tokens(pending[cut:]) > target:
+        cut += 1
+    # Never start the verbatim window on an assistant reply without its question
+    while cut < len(pending) - 1 and pending[cut]["role"] == "assistant":
+        cut += 1
+    return cut
+
+
+def build_messages(system_prompt, history, state, recent_turns=RECENT_TURNS, token_budget=TOKEN_BUDGET):
+    # Recent turns go verbatim; everything older is folded into a rolling summary kept in `state`
+    # (the session's dict), so each old turn is summarized only once. Folding is done in chunks
+    # rather than on every turn: once a full extra window of `recent_turns` pairs has piled up, or
+    # when the verbatim turns no longer fit the budget. Most turns therefore go out without
+    # waiting for a summary call, and nothing leaves the context without entering the summary.
+    keep = recent_turns * 2
+    # Room for verbatim turns, with the summary counted at its largest
+    room = token_budget - message_tokens({"content": system_prompt}) - SUMMARY_MAX_TOKENS - 20
+    folded = state.get("summarized_count", 0)
+    pending = history[folded:]
+
+    cut = len(pending) - keep if len(pending) > keep * 2 else 0
+    if _tokens(pending[cut:]) > room:
+        # Fold down to half the room, so the next few turns fit without another summary call
+        cut = _fold_point(pending, cut, room // 2)
+    else:
+        cut = _fold_point(pending, cut, room) if cut else 0
+    if cut:
+        try:
+            state["summary"] = summarize(state.get("summary", ""), pending[:cut])
+            state["summarized_count"] = folded + cut
+            pending = pending[cut:]
+        except Exception as e:
+            # Keep answering with what we have; the unsummarized turns are retried next time
+            print(f"CHAT SUMMARY ERROR: {str(e)}")
+
+    system_content = system_prompt
+    if state.get("summary"):
+        system_content += f"\nSummary of the earlier conversation: {state['summary']}"
+    system = {"role": "system", "content": system_content}
+
+    # Only reached when summarizing failed: drop the oldest verbatim turns; the newest message always goes
+    budget = token_budget - message_tokens(system)
+    kept = []
+    for message in reversed(pending):
+        cost = message_tokens(message)
+        if kept and cost > budget:
+            break
+        kept.append(message)
+        budget -= cost
+    kept.reverse()
+    while len(kept) > 1 and kept[0]["role"] == "assistant":
+        kept.pop(0)
+    return [system] + kept
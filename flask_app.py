@@ -1,62 +1,95 @@
 import os
+import io
 import json
-import base64
-import cv2
-import numpy as np
-from flask import Flask, render_template, request, jsonify
-from groq import Groq
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Request, Response, render_template, request, jsonify
 from dotenv import load_dotenv
 from werkzeug.utils import secure_filename
+import vision_cache
+import groq_client
+import metrics
+import prompts
+import image_prep
+from analysis_jobs import JobQueue, QueueFull
 
 load_dotenv()
 
+class InMemoryRequest(Request):
+    # Uploads are parsed straight into RAM (bounded by MAX_CONTENT_LENGTH) instead of being
+    # spooled to a temp file once they pass 500KB
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
+# Keeping a copy of every upload on disk is opt-in
+app.config['PERSIST_UPLOADS'] = os.getenv("PERSIST_UPLOADS", "0") == "1"
 
-if not os.path.exists(app.config['UPLOAD_FOLDER']):
+if app.config['PERSIST_UPLOADS'] and not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
 
+# Leading bytes of the image formats we accept
+IMAGE_SIGNATURES = {
+    "jpeg": (b"\xff\xd8\xff",),
+    "png": (b"\x89PNG\r\n\x1a\n",),
+    "webp": (b"RIFF",),
+}
+
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-client = Groq(api_key=GROQ_API_KEY)
-
-def analyze_image_with_vision(image_path):
-    with open(image_path, "rb") as image_file:
-        base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-
-    prompt = """
-    You are a professional fashion stylist and image consultant. Analyze this image deeply.
-    
-    1. Identify the person's features:
-       - Estimated Skin Tone (e.g., Warm, Cool, Olive, Fair, Deep)
-       - Body Shape/Type (if visible)
-       - Facial Features/Vibe
-       
-    2. Analyze the context/outfit (if present):
-       - Current Style
-       - Colors worn
-       - Occasion fit
-       
-    3. PROVIDE STYLING ADVICE:
-       - "What to Wear": Suggest 3 specific outfit ideas that would perfectly suit this person's features.
-       - "Why it Suits": Explain WHY these colors, cuts, and styles work for their specific skin tone and body type.
-       
-    4. ADDITIONAL ANALYSIS:
-       - "Style Score": Rate the outfit/look on a scale of 0-100 based on coordination, fit, and trendiness.
-       - "Mood & Vibe": Describe the mood (e.g., "Confident & Edgy", "Relaxed Boho").
-       - "Colors & Patterns": Analyze the color palette and any patterns used.
-       
-    Format the output as JSON with keys: 
-    "features", 
-    "outfit_ideas" (list of strings), 
-    "why_it_suits" (string), 
-    "style_score" (integer 0-100),
-    "mood_analysis" (string),
-    "color_pattern_analysis" (string).
-    """
+groq_client.warm_up_once()
+
+def detect_image_type(data):
+    for kind, signatures in IMAGE_SIGNATURES.items():
+        if any(data[:len(sig)] == sig for sig in signatures):
+            if kind == "webp" and data[8:12] != b"WEBP":
+                continue
+            return kind
+    return None
+
+def read_upload(file):
+    # One read of the parsed upload: getbuffer() exposes the BytesIO contents as a memoryview without copying
+    stream = file.stream
+    if isinstance(stream, io.BytesIO):
+        data = stream.getbuffer()
+    else:
+        data = memoryview(stream.read())
+    if len(data) == 0:
+        return None, "Empty file"
+    if detect_image_type(data) is None:
+        return None, "Unsupported file type. Please upload a JPEG, PNG or WebP image."
+    return data, None
+
+def persist_upload(filename, data):
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(filename) or "upload")
+    with open(filepath, "wb") as f:
+        f.write(data)
+
+def prepare_upload(data):
+    # Decode and downscale in the request, so a corrupt image is a 400 before any job or model call
+    try:
+        return image_prep.prepare_for_vision(data), None
+    except image_prep.CorruptImage as e:
+        return None, str(e)
+
+def analyze_image_with_vision(image_data):
+    # Raises image_prep.CorruptImage for bytes that do not decode
+    return analyze_prepared(image_prep.prepare_for_vision(image_data))
+
+def analyze_prepared(image_bytes):
+    # Shared with the Streamlit Smart Mirror: near-duplicate photos reuse the stored analysis
+    cached = vision_cache.lookup(image_bytes)
+    metrics.record_cache("analyze", cached is not None)
+    if cached is not None:
+        return cached
+    base64_image = image_prep.to_base64(image_bytes)
+
+    prompt = prompts.VISION.render()
 
     try:
-        chat_completion = client.chat.completions.create(
+        chat_completion = groq_client.chat_completion(
+            call_site="analyze",
             messages=[
                 {
                     "role": "user",
@@ -74,11 +107,35 @@ def analyze_image_with_vision(image_path):
             model="meta-llama/llama-4-scout-17b-16e-instruct",
             response_format={"type": "json_object"}
         )
-        return json.loads(chat_completion.choices[0].message.content)
+        result = json.loads(chat_completion.choices[0].message.content)
+        vision_cache.store(image_bytes, result)
+        return result
     except Exception as e:
         print(f"VISION API ERROR: {str(e)}")
         return {"error": str(e)}
 
+# Job mode for /analyze: bounded worker pool so a burst of uploads queues instead of pinning request workers
+analysis_queue = JobQueue(
+    analyze_prepared,
+    max_workers=int(os.getenv("ANALYZE_WORKERS", 4)),
+    max_pending=int(os.getenv("ANALYZE_QUEUE_SIZE", 16)),
+    result_ttl=int(os.getenv("ANALYZE_RESULT_TTL_SECONDS", 600)),
+)
+
+# Batch mode: one shared pool caps how many vision calls all batch requests make at once
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", 50))
+BATCH_MAX_CONTENT_LENGTH = int(os.getenv("BATCH_MAX_CONTENT_MB", 200)) * 1024 * 1024
+batch_pool = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="batch-analysis")
+
+@app.errorhandler(413)
+def too_large(e):
+    # Rejected from the Content-Length header, before any of the body is read. The batch route raises
+    # the limit for its own request, so report whichever one applied.
+    limit = request.max_content_length or app.config['MAX_CONTENT_LENGTH']
+    what = "Batch" if limit != app.config['MAX_CONTENT_LENGTH'] else "File"
+    return jsonify({"error": f"{what} too large (max {limit // (1024 * 1024)}MB)"}), 413
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -91,16 +148,97 @@ def analyze():
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
     if file:
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # Optional: OpenCV processing could go here
-        # image = cv2.imread(filepath)
-        # ...
+        data, error = read_upload(file)
+        if error:
+            return jsonify({"error": error}), 400
+        if app.config['PERSIST_UPLOADS']:
+            persist_upload(file.filename, data)
+        image_bytes, error = prepare_upload(data)
+        if error:
+            return jsonify({"error": error}), 400
         
-        result = analyze_image_with_vision(filepath)
+        result = analyze_prepared(image_bytes)
         return jsonify(result)
 
+@app.route('/analyze/jobs', methods=['POST'])
+def submit_analysis():
+    if 'file' not in request.files:
+        return jsonify({"error": "No file part"}), 400
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({"error": "No selected file"}), 400
+    data, error = read_upload(file)
+    if error:
+        return jsonify({"error": error}), 400
+    if app.config['PERSIST_UPLOADS']:
+        persist_upload(file.filename, data)
+    # The job outlives this request; the prepared image is already its own copy of the upload
+    image_bytes, error = prepare_upload(data)
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        job_id = analysis_queue.submit(image_bytes)
+    except QueueFull as e:
+        response = jsonify({"error": "Server busy, please retry shortly", "retry_after": e.retry_after})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 503
+    return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/analyze/jobs/{job_id}"}), 202
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    # Prometheus text format: per call site latency/token histograms plus a few live gauges
+    gauges = {
+        # Half-open counts as open while its one trial call is in flight
+        "groq_circuit_open": ("1 while the Groq circuit breaker is rejecting calls.", int(groq_client.breaker.rejecting)),
+        "analysis_queue_depth": ("Analysis jobs waiting or running.", analysis_queue.depth()),
+    }
+    return Response(metrics.render_prometheus(gauges), mimetype="text/plain; version=0.0.4")
+
+@app.route('/analyze/jobs/<job_id>', methods=['GET'])
+def analysis_status(job_id):
+    job = analysis_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job)
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    # A whole shoot in one multipart request; the body limit is raised for this route only
+    request.max_content_length = BATCH_MAX_CONTENT_LENGTH
+    files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+    if not files:
+        return jsonify({"error": "No files in request (use the 'files' field)"}), 400
+    if len(files) > BATCH_MAX_FILES:
+        return jsonify({"error": f"Too many files (max {BATCH_MAX_FILES} per batch)"}), 400
+
+    results = [None] * len(files)
+    pending = []
+    # The raised body limit is for the whole batch; every image still gets the single-upload limit
+    file_limit = app.config['MAX_CONTENT_LENGTH']
+    for index, file in enumerate(files):
+        data, error = read_upload(file)
+        if not error and len(data) > file_limit:
+            error = f"File too large (max {file_limit // (1024 * 1024)}MB)"
+        if error:
+            results[index] = {"filename": file.filename, "error": error}
+            continue
+        if app.config['PERSIST_UPLOADS']:
+            persist_upload(file.filename, data)
+        pending.append((index, file.filename, batch_pool.submit(analyze_image_with_vision, data)))
+
+    for index, filename, future in pending:
+        try:
+            # Decoding happens in the pool; a corrupt file fails only its own entry
+            result = future.result()
+        except Exception as e:
+            result = {"error": str(e)}
+        if "error" in result:
+            results[index] = {"filename": filename, "error": result["error"]}
+        else:
+            results[index] = {"filename": filename, "result": result}
+
+    failed = sum(1 for r in results if "error" in r)
+    return jsonify({"count": len(results), "succeeded": len(results) - failed, "failed": failed, "results": results})
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
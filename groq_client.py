@@ -0,0 +1,333 @@
+import os
+import random
+import threading
+import time
+
+import metrics
+
+# One Groq client per process. httpx keeps TLS connections alive in its pool, so every LLM helper
+# in app.py and flask_app.py reuses warm connections instead of paying a new handshake per call.
+POOL_SIZE = int(os.getenv("GROQ_POOL_SIZE", 20))
+KEEPALIVE_CONNECTIONS = int(os.getenv("GROQ_KEEPALIVE_CONNECTIONS", POOL_SIZE))
+KEEPALIVE_EXPIRY = float(os.getenv("GROQ_KEEPALIVE_EXPIRY_SECONDS", 60))
+CONNECT_TIMEOUT = float(os.getenv("GROQ_CONNECT_TIMEOUT_SECONDS", 5))
+READ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT_SECONDS", 60))
+
+# Client-side limits and failure handling shared by every completion call
+REQUESTS_PER_MINUTE = float(os.getenv("GROQ_RPM", 60))
+TOKENS_PER_MINUTE = float(os.getenv("GROQ_TPM", 60000))
+LIMITER_MAX_WAIT = float(os.getenv("GROQ_LIMITER_MAX_WAIT_SECONDS", 15))
+MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", 3))
+BACKOFF_BASE = float(os.getenv("GROQ_BACKOFF_BASE_SECONDS", 0.5))
+BACKOFF_MAX = float(os.getenv("GROQ_BACKOFF_MAX_SECONDS", 20))
+BREAKER_FAILURES = int(os.getenv("GROQ_BREAKER_FAILURES", 5))
+BREAKER_COOLDOWN = float(os.getenv("GROQ_BREAKER_COOLDOWN_SECONDS", 30))
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                # Imported on first use so pages that never call the model don't pay for the SDK
+                import httpx
+                from groq import DefaultHttpxClient, Groq
+
+                http_client = DefaultHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=POOL_SIZE,
+                        max_keepalive_connections=KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=KEEPALIVE_EXPIRY,
+                    ),
+                    timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                )
+                # The API key is read here rather than at import so load_dotenv() has already run
+                # Retries are done by chat_completion() so they share the limiter and circuit breaker
+                _client = Groq(api_key=os.getenv("GROQ_API_KEY"), http_client=http_client, max_retries=0)
+    return _client
+
+
+def warm_up(background=True):
+    # Opens a pooled connection ahead of the first real request (set GROQ_WARMUP=1 to do this at startup)
+    def _run():
+        try:
+            get_client().models.list()
+        except Exception as e:
+            print(f"GROQ WARMUP FAILED: {str(e)}")
+
+    if background:
+        threading.Thread(target=_run, name="groq-warmup", daemon=True).start()
+    else:
+        _run()
+
+
+_warmed = False
+
+
+def warm_up_once():
+    global _warmed
+    with _lock:
+        if _warmed or os.getenv("GROQ_WARMUP", "0") != "1" or not os.getenv("GROQ_API_KEY"):
+            return
+        _warmed = True
+    warm_up()
+
+
+def close():
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+class ProviderUnavailable(Exception):
+    pass
+
+
+class TokenBucket:
+    # Refills continuously at rate_per_minute; take() waits for capacity, up to max_wait seconds
+    def __init__(self, rate_per_minute):
+        self.capacity = rate_per_minute
+        self.rate = rate_per_minute / 60.0
+        self.tokens = rate_per_minute
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self, amount):
+        # Returns 0 when `amount` was taken, otherwise how long to wait before it could be
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            amount = min(amount, self.capacity)
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0
+            return (amount - self.tokens) / self.rate
+
+    def take(self, amount=1, max_wait=LIMITER_MAX_WAIT):
+        if self.capacity <= 0:
+            return
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self._reserve(amount)
+            if wait == 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise ProviderUnavailable("Client-side rate limit reached, please try again shortly")
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    # Opens after `threshold` consecutive provider failures; after `cooldown` one trial call is let through
+    def __init__(self, threshold=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    @property
+    def rejecting(self):
+        # What allow() would answer right now, without taking the trial slot
+        with self.lock:
+            if self.opened_at is None:
+                return False
+            return time.monotonic() - self.opened_at < self.cooldown or self.trial_in_flight
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def release(self):
+        # The call proved nothing about the provider (limiter rejection, 4xx, local error): free the trial slot
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+request_bucket = TokenBucket(REQUESTS_PER_MINUTE)
+token_bucket = TokenBucket(TOKENS_PER_MINUTE)
+breaker = CircuitBreaker()
+
+
+def estimate_prompt_tokens(create_kwargs):
+    # Rough prompt size: 4 chars per token, a flat cost per image
+    total = 0
+    for message in create_kwargs.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            total += len(content) // 4
+        else:
+            for part in content or []:
+                total += len(part.get("text", "")) // 4 if part.get("type") == "text" else 1000
+    return total
+
+
+def estimate_request_tokens(create_kwargs):
+    # Prompt plus the completion allowance
+    return estimate_prompt_tokens(create_kwargs) + create_kwargs.get("max_tokens", 500)
+
+
+def _is_retryable(error):
+    from groq import APIConnectionError, APIStatusError
+
+    if isinstance(error, APIConnectionError):  # includes timeouts
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        if "retry-after-ms" in response.headers:
+            return float(response.headers["retry-after-ms"]) / 1000
+        if "retry-after" in response.headers:
+            return float(response.headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    # Full-jitter exponential backoff, never sooner than the server asked for
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, BACKOFF_MAX))
+    return delay
+
+
+def chat_completion(call_site="unknown", **create_kwargs):
+    # Every completion request goes through here: breaker check, rate limiting, retries, metrics.
+    # Streams are measured by CompletionStream instead, once they have been read to the end.
+    if create_kwargs.get("stream"):
+        return _create_with_retries(call_site, {"retries": 0}, create_kwargs)
+    started = time.perf_counter()
+    attempts = {"retries": 0}
+    try:
+        response = _create_with_retries(call_site, attempts, create_kwargs)
+    except Exception as e:
+        metrics.observe_call(call_site, create_kwargs.get("model"), time.perf_counter() - started,
+                             error=metrics.error_class(e), retries=attempts["retries"])
+        raise
+    usage = getattr(response, "usage", None)
+    metrics.observe_call(
+        call_site, create_kwargs.get("model"), time.perf_counter() - started,
+        prompt_tokens=getattr(usage, "prompt_tokens", None), completion_tokens=getattr(usage, "completion_tokens", None),
+        retries=attempts["retries"],
+    )
+    return response
+
+
+def _create_with_retries(call_site, attempts, create_kwargs):
+    if not breaker.allow():
+        raise ProviderUnavailable("The AI service is temporarily unavailable, please try again shortly")
+    settled = False
+    try:
+        attempt = 0
+        while True:
+            # Every attempt, retries included, waits its turn at the limiter
+            request_bucket.take(1)
+            token_bucket.take(estimate_request_tokens(create_kwargs))
+            try:
+                response = get_client().chat.completions.create(**create_kwargs)
+            except Exception as e:
+                if not _is_retryable(e):
+                    raise
+                if attempt >= MAX_RETRIES:
+                    breaker.record_failure()
+                    settled = True
+                    print(f"GROQ CALL FAILED [{call_site}]: {str(e)}")
+                    raise
+                time.sleep(backoff_delay(attempt, _retry_after(e)))
+                attempt += 1
+                attempts["retries"] = attempt
+                continue
+            breaker.record_success()
+            settled = True
+            return response
+    finally:
+        if not settled:
+            # Bad requests and limiter rejections are our problem, not the provider's: leave the breaker
+            # alone, but never keep a half-open trial slot taken
+            breaker.release()
+
+
+class CompletionStream:
+    # Iterating yields text deltas as they arrive; afterwards .text holds the full completion.
+    # time_to_first_token / total_time are wall-clock seconds measured from the request.
+    def __init__(self, on_complete=None, call_site="unknown", **create_kwargs):
+        self.call_site = call_site
+        self.create_kwargs = create_kwargs
+        self.on_complete = on_complete
+        self.text = ""
+        self.time_to_first_token = None
+        self.total_time = None
+
+    def __iter__(self):
+        start = time.perf_counter()
+        model = self.create_kwargs.get("model")
+        attempts = {"retries": 0}
+        parts = []
+        usage = None
+        try:
+            stream = _create_with_retries(self.call_site, attempts, dict(self.create_kwargs, stream=True))
+            for chunk in stream:
+                # Groq reports usage on the last chunk
+                usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if self.time_to_first_token is None:
+                    self.time_to_first_token = time.perf_counter() - start
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            metrics.observe_call(self.call_site, model, time.perf_counter() - start, error=metrics.error_class(e),
+                                 retries=attempts["retries"])
+            raise
+        self.text = "".join(parts)
+        self.total_time = time.perf_counter() - start
+        metrics.observe_call(
+            self.call_site, model, self.total_time,
+            prompt_tokens=getattr(usage, "prompt_tokens", None) or estimate_prompt_tokens(self.create_kwargs),
+            completion_tokens=getattr(usage, "completion_tokens", None) or len(self.text) // 4,
+            retries=attempts["retries"], time_to_first_token=self.time_to_first_token,
+        )
+        if self.on_complete:
+            self.on_complete(self.text)
+
+
+def stream_completion(on_complete=None, call_site="unknown", **create_kwargs):
+    return CompletionStream(on_complete=on_complete, call_site=call_site, **create_kwargs)
@@ -0,0 +1,241 @@
+import copy
+import json
+import os
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+HISTORY_DIR = os.getenv("STYLESENSE_HISTORY_DIR", "history_log")
+SEGMENT_MAX_BYTES = int(os.getenv("HISTORY_SEGMENT_MAX_BYTES", 8 * 1024 * 1024))
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("HISTORY_PAGE_CACHE_ENTRIES", 1024))
+INDEX_FILE = "index.tsv"
+LOCK_FILE = ".lock"
+
+# Append-only layout:
+#   segment-000001.jsonl ... one JSON record per line, new segment once the active one is full
+#   index.tsv            one "user<TAB>segment<TAB>offset<TAB>length" line per record
+# Readers keep the index in memory and only read the tail that was appended since last time,
+# so looking up one user's history never touches anyone else's records.
+# history_search follows the same index tail to keep its full-text index current.
+
+_lock = threading.Lock()
+_index = {}
+_index_pos = 0
+_index_head = b""  # first index line the in-memory index was built from
+# Pages already read, valid until the index moves (reruns re-read the same page constantly)
+_pages = {}
+
+
+def _path(name):
+    return os.path.join(HISTORY_DIR, name)
+
+
+def _segment_name(number):
+    return f"segment-{number:06d}.jsonl"
+
+
+def _active_segment():
+    segments = sorted(f for f in os.listdir(HISTORY_DIR) if f.startswith("segment-"))
+    if not segments:
+        return _segment_name(1)
+    last = segments[-1]
+    if os.path.getsize(_path(last)) >= SEGMENT_MAX_BYTES:
+        return _segment_name(int(last[len("segment-"):-len(".jsonl")]) + 1)
+    return last
+
+
+class _FileLock:
+    # Serializes appends across Streamlit sessions (threads) and server processes
+    def __enter__(self):
+        _lock.acquire()
+        os.makedirs(HISTORY_DIR, exist_ok=True)
+        self.handle = open(_path(LOCK_FILE), "a")
+        if fcntl:
+            fcntl.flock(self.handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+        self.handle.close()
+        _lock.release()
+
+
+def now_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+# --- Writes ---
+def append(entry):
+    return append_many([entry])
+
+
+def append_many(entries):
+    if not entries:
+        return 0
+    with _FileLock():
+        segment = _active_segment()
+        index_lines = []
+        with open(_path(segment), "ab") as seg:
+            for entry in entries:
+                record = dict(entry)
+                record.setdefault("timestamp", now_timestamp())
+                line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+                offset = seg.tell()
+                seg.write(line)
+                index_lines.append(f"{_clean(record.get('user'))}\t{segment}\t{offset}\t{len(line)}\n")
+            seg.flush()
+            os.fsync(seg.fileno())
+        # The index is written after the data, so an indexed record is always complete
+        with open(_path(INDEX_FILE), "a", encoding="utf-8") as idx:
+            idx.writelines(index_lines)
+    return len(entries)
+
+
+def replace_all(entries):
+    # Used by storage.save_data(); the only operation that rewrites the log
+    with _FileLock():
+        for name in os.listdir(HISTORY_DIR):
+            if name.startswith("segment-") or name == INDEX_FILE:
+                os.remove(_path(name))
+    global _index_pos, _index_head
+    with _lock:
+        _index.clear()
+        _index_pos = 0
+        _index_head = b""
+        _pages.clear()
+    append_many(entries)
+
+
+# --- Reads ---
+def _refresh_index():
+    global _index_pos, _index_head
+    path = _path(INDEX_FILE)
+    with _lock:
+        if not os.path.exists(path):
+            _index.clear()
+            _index_pos = 0
+            _index_head = b""
+            return
+        size = os.path.getsize(path)
+        # Another process's replace_all() can leave an index as large as ours or larger: the first
+        # line changing is what gives it away (the same check history_search.catch_up() makes)
+        head = index_head()
+        if size < _index_pos or head != _index_head:
+            _index.clear()
+            _pages.clear()
+            _index_pos = 0
+            _index_head = head
+        if size == _index_pos:
+            return
+        _pages.clear()
+        with open(path, "rb") as idx:
+            idx.seek(_index_pos)
+            chunk = idx.read(size - _index_pos)
+        # Only consume whole lines; a half-written tail is picked up next time
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].decode("utf-8").splitlines():
+            user, segment, offset, length = line.split("\t")
+            _index.setdefault(user, []).append((segment, int(offset), int(length)))
+        _index_pos += end
+
+
+def _read_records(locations):
+    records = []
+    handles = {}
+    try:
+        for segment, offset, length in locations:
+            seg = handles.get(segment)
+            if seg is None:
+                seg = handles[segment] = open(_path(segment), "rb")
+            seg.seek(offset)
+            records.append(json.loads(seg.read(length)))
+    finally:
+        for seg in handles.values():
+            seg.close()
+    return records
+
+
+def count_for_user(username):
+    _refresh_index()
+    return len(_index.get(_clean(username), []))
+
+
+def read_user(username, limit=None, newest_first=False, offset=0):
+    _refresh_index()
+    key = (_clean(username), limit, newest_first, offset)
+    with _lock:
+        cached = _pages.get(key)
+        locations = _index.get(key[0], [])
+        position = _index_pos
+    if cached is not None:
+        return copy.deepcopy(cached)
+    if newest_first:
+        locations = locations[::-1]
+    end = None if limit is None else offset + limit
+    records = _read_records(locations[offset:end])
+    if limit is not None:
+        with _lock:
+            if _index_pos == position:
+                if len(_pages) >= PAGE_CACHE_MAX_ENTRIES:
+                    _pages.clear()
+                _pages[key] = copy.deepcopy(records)
+    return records
+
+
+def read_locations(locations):
+    return _read_records(locations)
+
+
+def index_head():
+    # First index line; it changes when the log is replaced, which tells followers to start over
+    try:
+        with open(_path(INDEX_FILE), "rb") as idx:
+            return idx.readline()
+    except OSError:
+        return b""
+
+
+def index_size():
+    try:
+        return os.path.getsize(_path(INDEX_FILE))
+    except OSError:
+        return 0
+
+
+def index_tail(position):
+    # Index lines appended after byte `position`: ([(user, (segment, offset, length)), ...], new position)
+    path = _path(INDEX_FILE)
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return [], 0
+    if size <= position:
+        return [], position
+    with open(path, "rb") as idx:
+        idx.seek(position)
+        chunk = idx.read(size - position)
+    end = chunk.rfind(b"\n") + 1
+    entries = []
+    for line in chunk[:end].decode("utf-8").splitlines():
+        user, segment, offset, length = line.split("\t")
+        entries.append((user, (segment, int(offset), int(length))))
+    return entries, position + end
+
+
+def read_all():
+    entries = []
+    if not os.path.isdir(HISTORY_DIR):
+        return entries
+    for name in sorted(f for f in os.listdir(HISTORY_DIR) if f.startswith("segment-")):
+        with open(_path(name), "r", encoding="utf-8") as seg:
+            entries.extend(json.loads(line) for line in seg if line.strip())
+    return entries
+
+
+def _clean(username):
+    return str(username or "").replace("\t", " ").replace("\n", " ")
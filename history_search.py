@@ -0,0 +1,111 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+
+import history_log
+
+# Full-text index over history topics and content, kept in SQLite FTS5 next to the log.
+# It stores only postings and record locations; the records themselves stay in the segments.
+# Each search first indexes whatever was appended to the log since the last one.
+SEARCH_DB = os.path.join(history_log.HISTORY_DIR, "search.db")
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+    owner, topic, content, content='', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value BLOB
+);
+"""
+
+_local = threading.local()
+
+
+def _conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(history_log.HISTORY_DIR, exist_ok=True)
+        conn = sqlite3.connect(SEARCH_DB, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def _owner(username):
+    # Users become one opaque token, so scoping a query is just one more posting list to intersect
+    return "u" + hashlib.sha1(str(username or "").encode("utf-8")).hexdigest()[:20]
+
+
+def _state(conn, key, default):
+    row = conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def _set_state(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+
+
+def catch_up():
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        position = _state(conn, "position", 0)
+        head = history_log.index_head()
+        if head != _state(conn, "head", b"") or history_log.index_size() < position:
+            # The log was replaced (or is new): index it from scratch
+            conn.execute("INSERT INTO history_fts (history_fts) VALUES ('delete-all')")
+            conn.execute("DELETE FROM docs")
+            position = 0
+            _set_state(conn, "head", head)
+        entries, new_position = history_log.index_tail(position)
+        if entries:
+            records = history_log.read_locations([location for _, location in entries])
+            for (user, (segment, offset, length)), record in zip(entries, records):
+                cur = conn.execute("INSERT INTO docs (segment, offset, length) VALUES (?, ?, ?)",
+                                   (segment, offset, length))
+                conn.execute(
+                    "INSERT INTO history_fts (rowid, owner, topic, content) VALUES (?, ?, ?, ?)",
+                    (cur.lastrowid, _owner(user), str(record.get("topic") or ""), str(record.get("content") or "")),
+                )
+        _set_state(conn, "position", new_position)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return len(entries)
+
+
+def build_query(text):
+    # Every word must appear in the topic or content; the last one may still be half-typed
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words[:-1]] + [f'"{words[-1]}"*']
+    return "{topic content} : (" + " AND ".join(terms) + ")"
+
+
+def search(username, text, limit=20, offset=0):
+    # Returns (records newest first, total matches) for this user's history only
+    query = build_query(text)
+    if query is None:
+        return [], 0
+    catch_up()
+    match = f"owner : {_owner(username)} AND {query}"
+    conn = _conn()
+    total = conn.execute("SELECT COUNT(*) FROM history_fts WHERE history_fts MATCH ?", (match,)).fetchone()[0]
+    rows = conn.execute(
+        "SELECT d.segment, d.offset, d.length FROM history_fts f JOIN docs d ON d.id = f.rowid "
+        "WHERE history_fts MATCH ? ORDER BY f.rowid DESC LIMIT ? OFFSET ?",
+        (match, limit, offset),
+    ).fetchall()
+    return history_log.read_locations([tuple(r) for r in rows]), total
@@ -0,0 +1,43 @@
+import base64
+import os
+
+import cv2
+import numpy as np
+
+# Vision models do not need full-resolution photos; a bounded JPEG keeps payloads (and latency) small
+MAX_EDGE = int(os.getenv("VISION_MAX_EDGE", 1024))
+JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", 80))
+
+
+class CorruptImage(ValueError):
+    pass
+
+
+def normalize_image(image_bytes, max_edge=MAX_EDGE, quality=JPEG_QUALITY):
+    # IMREAD_COLOR also applies the EXIF orientation tag, so phone photos come out upright
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Unsupported or corrupt image")
+    height, width = image.shape[:2]
+    scale = max_edge / max(height, width)
+    if scale < 1:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1])
+    if not ok:
+        raise ValueError("Could not encode image")
+    return encoded.tobytes()
+
+
+def prepare_for_vision(image_bytes):
+    # Returns the bytes to analyze. Anything OpenCV cannot read is rejected rather than sent as is:
+    # the raw upload would bypass the payload bound
+    try:
+        return normalize_image(image_bytes)
+    except (ValueError, cv2.error) as e:
+        print(f"IMAGE PREP FAILED: {str(e)}")
+        raise CorruptImage("Corrupt or unreadable image") from e
+
+
+def to_base64(image_bytes):
+    return base64.b64encode(image_bytes).decode("utf-8")
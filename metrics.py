@@ -0,0 +1,196 @@
+import threading
+import time
+
+# In-process metrics for every Groq call, labelled by call site and model. groq_client records
+# each completion here; flask_app.py serves them at /metrics (Prometheus text format) and the
+# Metrics page in app.py shows the same numbers. Each process (Streamlit, Flask) has its own.
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+_lock = threading.Lock()
+_started = time.time()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation (what Prometheus would estimate)
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+_requests = {}      # (call_site, model, status) -> count
+_errors = {}        # (call_site, model, error) -> count
+_retries = {}       # (call_site, model) -> count
+_tokens = {}        # (call_site, model, kind) -> count
+_latency = {}       # (call_site, model) -> Histogram
+_ttft = {}          # (call_site, model) -> Histogram
+_prompt_sizes = {}  # (call_site, model) -> Histogram
+_cache = {}         # (call_site, result) -> count
+_overruns = {}      # (call_site, action) -> count
+
+
+def _inc(table, key, amount=1):
+    table[key] = table.get(key, 0) + amount
+
+
+def _histogram(table, key, buckets):
+    hist = table.get(key)
+    if hist is None:
+        hist = table[key] = Histogram(buckets)
+    return hist
+
+
+def observe_call(call_site, model, latency, prompt_tokens=None, completion_tokens=None, error=None,
+                 retries=0, time_to_first_token=None):
+    model = model or "unknown"
+    with _lock:
+        _inc(_requests, (call_site, model, "error" if error else "ok"))
+        if error:
+            _inc(_errors, (call_site, model, error))
+        if retries:
+            _inc(_retries, (call_site, model), retries)
+        _histogram(_latency, (call_site, model), LATENCY_BUCKETS).observe(latency)
+        if time_to_first_token is not None:
+            _histogram(_ttft, (call_site, model), LATENCY_BUCKETS).observe(time_to_first_token)
+        if prompt_tokens is not None:
+            _inc(_tokens, (call_site, model, "prompt"), prompt_tokens)
+            _histogram(_prompt_sizes, (call_site, model), TOKEN_BUCKETS).observe(prompt_tokens)
+        if completion_tokens is not None:
+            _inc(_tokens, (call_site, model, "completion"), completion_tokens)
+
+
+def record_cache(call_site, hit):
+    # Answers served without a model call (response cache, vision cache, precomputed advice)
+    with _lock:
+        _inc(_cache, (call_site, "hit" if hit else "miss"))
+
+
+def record_prompt_overrun(call_site, action):
+    # action: "truncated" (cut down to budget) or "over" (still over budget after cutting)
+    with _lock:
+        _inc(_overruns, (call_site, action))
+
+
+def error_class(error):
+    status = getattr(error, "status_code", None)
+    name = type(error).__name__
+    return f"{name}:{status}" if status else name
+
+
+def reset():
+    with _lock:
+        for table in (_requests, _errors, _retries, _tokens, _latency, _ttft, _prompt_sizes, _cache, _overruns):
+            table.clear()
+
+
+# --- Views ---
+def summary():
+    # One row per (call_site, model), for the admin page
+    with _lock:
+        rows = []
+        for (call_site, model), hist in sorted(_latency.items()):
+            errors = _requests.get((call_site, model, "error"), 0)
+            ttft = _ttft.get((call_site, model))
+            rows.append({
+                "call_site": call_site,
+                "model": model,
+                "calls": hist.count,
+                "errors": errors,
+                "error_rate": round(errors / hist.count, 3) if hist.count else 0,
+                "avg_latency_s": round(hist.sum / hist.count, 3) if hist.count else None,
+                "p50_latency_s": hist.quantile(0.5),
+                "p95_latency_s": hist.quantile(0.95),
+                "p50_ttft_s": ttft.quantile(0.5) if ttft else None,
+                "total_latency_s": round(hist.sum, 2),
+                "prompt_tokens": _tokens.get((call_site, model, "prompt"), 0),
+                "completion_tokens": _tokens.get((call_site, model, "completion"), 0),
+                "retries": _retries.get((call_site, model), 0),
+            })
+        errors = [{"call_site": c, "model": m, "error": e, "count": n} for (c, m, e), n in sorted(_errors.items())]
+        cache = {}
+        for (call_site, result), n in _cache.items():
+            cache.setdefault(call_site, {"hit": 0, "miss": 0})[result] = n
+        overruns = [{"call_site": c, "action": a, "count": n} for (c, a), n in sorted(_overruns.items())]
+        return {"calls": rows, "errors": errors, "cache": cache, "overruns": overruns,
+                "uptime_s": round(time.time() - _started)}
+
+
+def _labels(**labels):
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+    return "{" + inner + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _render_histogram(lines, name, table):
+    for (call_site, model), hist in sorted(table.items()):
+        cumulative = 0
+        for bound, n in zip(hist.buckets, hist.counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_labels(call_site=call_site, model=model, le=bound)} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(call_site=call_site, model=model, le='+Inf')} {hist.count}")
+        lines.append(f"{name}_sum{_labels(call_site=call_site, model=model)} {hist.sum}")
+        lines.append(f"{name}_count{_labels(call_site=call_site, model=model)} {hist.count}")
+
+
+def render_prometheus(gauges=None):
+    # gauges: extra {name: (help, value)} sampled by the caller, e.g. circuit breaker state
+    lines = []
+    with _lock:
+        lines += ["# HELP llm_requests_total Groq completion calls by outcome.", "# TYPE llm_requests_total counter"]
+        for (call_site, model, status), n in sorted(_requests.items()):
+            lines.append(f"llm_requests_total{_labels(call_site=call_site, model=model, status=status)} {n}")
+        lines += ["# HELP llm_errors_total Failed Groq calls by error class.", "# TYPE llm_errors_total counter"]
+        for (call_site, model, error), n in sorted(_errors.items()):
+            lines.append(f"llm_errors_total{_labels(call_site=call_site, model=model, error=error)} {n}")
+        lines += ["# HELP llm_retries_total Retried Groq attempts.", "# TYPE llm_retries_total counter"]
+        for (call_site, model), n in sorted(_retries.items()):
+            lines.append(f"llm_retries_total{_labels(call_site=call_site, model=model)} {n}")
+        lines += ["# HELP llm_tokens_total Prompt and completion tokens.", "# TYPE llm_tokens_total counter"]
+        for (call_site, model, kind), n in sorted(_tokens.items()):
+            lines.append(f"llm_tokens_total{_labels(call_site=call_site, model=model, kind=kind)} {n}")
+        lines += ["# HELP llm_request_duration_seconds Groq call latency including retries.",
+                  "# TYPE llm_request_duration_seconds histogram"]
+        _render_histogram(lines, "llm_request_duration_seconds", _latency)
+        lines += ["# HELP llm_time_to_first_token_seconds Streaming time to first token.",
+                  "# TYPE llm_time_to_first_token_seconds histogram"]
+        _render_histogram(lines, "llm_time_to_first_token_seconds", _ttft)
+        lines += ["# HELP llm_prompt_tokens Prompt size per call.", "# TYPE llm_prompt_tokens histogram"]
+        _render_histogram(lines, "llm_prompt_tokens", _prompt_sizes)
+        lines += ["# HELP llm_cache_lookups_total Answers looked up before calling the model.",
+                  "# TYPE llm_cache_lookups_total counter"]
+        for (call_site, result), n in sorted(_cache.items()):
+            lines.append(f"llm_cache_lookups_total{_labels(call_site=call_site, result=result)} {n}")
+        lines += ["# HELP llm_prompt_budget_overruns_total Prompts rendered over their token budget.",
+                  "# TYPE llm_prompt_budget_overruns_total counter"]
+        for (call_site, action), n in sorted(_overruns.items()):
+            lines.append(f"llm_prompt_budget_overruns_total{_labels(call_site=call_site, action=action)} {n}")
+    for name, (help_text, value) in (gauges or {}).items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,166 @@
+import os
+import re
+from itertools import product
+
+# Mix & Match used to paste the whole closet into one prompt. Instead, outfits are assembled and
+# ranked here, and only a shortlist of the best candidates is sent to the model for final styling.
+SHORTLIST_SIZE = int(os.getenv("MIX_MATCH_SHORTLIST", 5))
+# Per-slot pruning before combining, so the product stays small however big the closet is
+PER_SLOT = int(os.getenv("MIX_MATCH_PER_SLOT", 6))
+
+# Keyword -> weight for each occasion. Positive words suit the occasion, negative ones clash with it.
+OCCASIONS = {
+    "Weekend Casual": {
+        "jeans": 2, "denim": 2, "tee": 2, "t-shirt": 2, "hoodie": 2, "sweatshirt": 2, "sneakers": 2,
+        "shorts": 1, "cardigan": 1, "sweater": 1, "jumper": 1, "sandals": 1, "cap": 1, "tote": 1, "linen": 1,
+        "sundress": 1, "overalls": 1, "flannel": 1,
+        "tuxedo": -3, "gown": -3, "suit": -2, "sequin": -2, "stiletto": -2, "tie": -1, "heels": -1,
+    },
+    "Work/Office": {
+        "blazer": 3, "trousers": 2, "chinos": 2, "shirt": 2, "blouse": 2, "button-down": 2, "oxford": 2,
+        "loafers": 2, "pencil": 2, "suit": 2, "sheath": 2, "pumps": 1, "cardigan": 1, "sweater": 1, "watch": 1,
+        "belt": 1, "trench": 1, "midi": 1, "heels": 1,
+        "hoodie": -3, "shorts": -3, "flip-flops": -3, "ripped": -2, "sequin": -2, "crop": -2, "tank": -2,
+        "sweatpants": -3, "joggers": -2, "sneakers": -1, "tee": -1, "t-shirt": -1,
+    },
+    "Date Night": {
+        "silk": 2, "satin": 2, "slip": 2, "heels": 2, "boots": 1, "leather": 2, "blazer": 1, "bodycon": 2,
+        "wrap": 1, "midi": 1, "shirt": 1, "blouse": 1, "earrings": 1, "necklace": 1, "clutch": 2, "loafers": 1,
+        "lace": 1, "velvet": 1,
+        "hoodie": -2, "sweatpants": -3, "joggers": -2, "flip-flops": -2, "cargo": -1, "fleece": -2,
+    },
+    "Party": {
+        "sequin": 3, "sparkle": 2, "glitter": 2, "metallic": 2, "velvet": 2, "satin": 2, "mini": 2,
+        "heels": 2, "bodycon": 2, "clutch": 2, "leather": 1, "statement": 2, "earrings": 1, "boots": 1,
+        "crop": 1, "jumpsuit": 1,
+        "sweatpants": -3, "fleece": -2, "flip-flops": -2, "cardigan": -1, "chinos": -1, "oxford": -1,
+    },
+}
+
+# Colour words -> hue on a 12-step wheel; None marks neutrals, which go with everything
+COLORS = {
+    "black": None, "white": None, "grey": None, "gray": None, "beige": None, "cream": None, "ivory": None,
+    "tan": None, "camel": None, "khaki": None, "nude": None, "denim": None, "silver": None, "gold": None,
+    "navy": None, "brown": None, "charcoal": None, "taupe": None,
+    "red": 0, "burgundy": 0, "maroon": 0, "coral": 1, "orange": 1, "rust": 1, "mustard": 2, "yellow": 2,
+    "lime": 3, "green": 4, "olive": 3, "emerald": 4, "sage": 4, "mint": 5, "teal": 6, "turquoise": 6,
+    "blue": 7, "cobalt": 7, "purple": 9, "lavender": 9, "lilac": 9, "violet": 9, "magenta": 10,
+    "pink": 11, "blush": 11, "fuchsia": 11,
+}
+
+# Outfits are either a dress or a top with a bottom, plus optional shoes, outerwear and accessory
+SLOTS = ["Outerwear", "Shoes", "Accessory"]
+SLOT_BONUS = {"Outerwear": 1, "Shoes": 2, "Accessory": 1}
+
+
+def _words(text):
+    return set(re.findall(r"[a-z-]+", text.lower()))
+
+
+def item_hues(item):
+    words = _words(item)
+    return [COLORS[w] for w in words if w in COLORS]
+
+
+def occasion_score(item, occasion):
+    weights = OCCASIONS.get(occasion, {})
+    words = _words(item)
+    words |= {w.rstrip("s") for w in words}
+    return sum(weight for word, weight in weights.items() if word in words)
+
+
+def _hue_gap(a, b):
+    gap = abs(a - b) % 12
+    return min(gap, 12 - gap)
+
+
+def harmony_score(items):
+    # Neutrals are free. Same or adjacent hues and complementary pairs harmonize; anything beyond
+    # two distinct accent colours reads as busy.
+    hues = sorted({h for item in items for h in item_hues(item) if h is not None})
+    if len(hues) <= 1:
+        return 2 if hues else 1
+    score = 0
+    for i, a in enumerate(hues):
+        for b in hues[i + 1:]:
+            gap = _hue_gap(a, b)
+            if gap <= 1:
+                score += 1
+            elif gap == 6 or gap == 4:  # complementary or triadic
+                score += 1
+            else:
+                score -= 2
+    if len(hues) > 2:
+        score -= 2 * (len(hues) - 2)
+    return score
+
+
+def _shortlist_slot(items, occasion, limit):
+    # Drop pieces that clash with the occasion, keep the best few
+    scored = [(occasion_score(i["item"], occasion), idx, i) for idx, i in enumerate(items)]
+    scored = [s for s in scored if s[0] >= 0]
+    scored.sort(key=lambda s: (-s[0], s[1]))
+    return [(score, i) for score, _, i in scored[:limit]]
+
+
+def _bases(by_cat, occasion):
+    tops = _shortlist_slot(by_cat.get("Top", []), occasion, PER_SLOT)
+    bottoms = _shortlist_slot(by_cat.get("Bottom", []), occasion, PER_SLOT)
+    for (s1, top), (s2, bottom) in product(tops, bottoms):
+        yield s1 + s2, [top, bottom]
+    for score, dress in _shortlist_slot(by_cat.get("Dress", []), occasion, PER_SLOT):
+        # A dress is a whole base on its own; weight it like a top plus bottom
+        yield score * 2, [dress]
+
+
+def combine(wardrobe, occasion, limit=None):
+    # Returns up to `limit` outfits, best first: {"items": [...], "score": int}
+    limit = SHORTLIST_SIZE if limit is None else limit
+    by_cat = {}
+    for entry in wardrobe:
+        by_cat.setdefault(entry["category"], []).append(entry)
+
+    extras = {slot: [(0, None)] + _shortlist_slot(by_cat.get(slot, []), occasion, PER_SLOT) for slot in SLOTS}
+    candidates = []
+    for base_score, base in _bases(by_cat, occasion):
+        for combo in product(*(extras[slot] for slot in SLOTS)):
+            chosen = {slot: item for slot, (_, item) in zip(SLOTS, combo) if item is not None}
+            pieces = base + list(chosen.values())
+            score = base_score + sum(s for s, _ in combo)
+            # Completeness counts: shoes matter most, a layer or an accessory a little
+            score += sum(SLOT_BONUS[slot] for slot in chosen)
+            score += harmony_score([p["item"] for p in pieces])
+            candidates.append((score, pieces))
+
+    candidates.sort(key=lambda c: -c[0])
+    outfits = []
+    seen_bases = {}
+    for score, pieces in candidates:
+        # Keep the shortlist varied: at most two outfits around the same top/bottom or dress
+        base_key = tuple(p["item"] for p in pieces if p["category"] in ("Top", "Bottom", "Dress"))
+        if seen_bases.get(base_key, 0) >= 2:
+            continue
+        seen_bases[base_key] = seen_bases.get(base_key, 0) + 1
+        outfits.append({"items": pieces, "score": score})
+        if len(outfits) >= limit:
+            break
+    return outfits
+
+
+def missing_basics(wardrobe):
+    # What the closet would need before any outfit can be built at all
+    cats = {entry["category"] for entry in wardrobe}
+    missing = []
+    if "Dress" not in cats and not ("Top" in cats and "Bottom" in cats):
+        missing.extend(c for c in ["Top", "Bottom"] if c not in cats)
+    if "Shoes" not in cats:
+        missing.append("Shoes")
+    return missing
+
+
+def describe(outfits):
+    lines = []
+    for n, outfit in enumerate(outfits, 1):
+        pieces = ", ".join(f"{p['item']} ({p['category']})" for p in outfit["items"])
+        lines.append(f"{n}. {pieces}")
+    return "\n".join(lines)
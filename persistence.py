@@ -0,0 +1,190 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+# Small state files (trend metadata, the style guide store) are written through here:
+#   atomic_write  temp file in the same directory + fsync + rename, under a per-file lock,
+#                 so readers never see a half-written file and writers never interleave
+#   buffer        write-behind: repeated updates to the same file within FLUSH_INTERVAL
+#                 are coalesced into one write of the latest value. Every update and every
+#                 direct buffer.write_json() gets a generation number, so a flush never
+#                 writes a value older than what is already on disk.
+FLUSH_INTERVAL = float(os.getenv("PERSIST_FLUSH_INTERVAL_SECONDS", 2))
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _thread_lock(path):
+    with _locks_guard:
+        return _locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+@contextmanager
+def locked(path):
+    # Exclusive across threads and processes; hold it around read-modify-write cycles
+    with _thread_lock(path):
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with open(path + ".lock", "a") as handle:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _replace(path, data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write(path, data, lock=True):
+    # Pass lock=False when the caller already holds locked(path)
+    if not lock:
+        return _replace(path, data)
+    with locked(path):
+        _replace(path, data)
+
+
+def atomic_write_json(path, obj, lock=True, **dump_kwargs):
+    atomic_write(path, json.dumps(obj, **dump_kwargs), lock=lock)
+
+
+class WriteBehind:
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        # Overlapping flushes (background loop, atexit, on demand) would otherwise share _flushing
+        self._flush_lock = threading.Lock()
+        self._dirty = {}     # path -> (obj, updates coalesced, generation)
+        self._flushing = {}
+        self._written = {}   # path -> generation of the value on disk
+        self._generation = 0
+        self._thread = None
+        self._stats = {"mutations": 0, "flushed_mutations": 0, "writes": 0, "flushes": 0, "failures": 0,
+                       "superseded": 0, "flush_seconds": 0.0, "last_flush_seconds": 0.0, "max_flush_seconds": 0.0}
+
+    def _next_generation(self):
+        # Caller holds self._lock
+        self._generation += 1
+        return self._generation
+
+    def put_json(self, path, obj):
+        with self._lock:
+            count = self._dirty[path][1] if path in self._dirty else 0
+            self._dirty[path] = (obj, count + 1, self._next_generation())
+            self._stats["mutations"] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="write-behind", daemon=True)
+                self._thread.start()
+
+    def pending(self, path):
+        # Latest unflushed value, so readers in this process see their own writes
+        with self._lock:
+            entry = self._dirty.get(path) or self._flushing.get(path)
+            if entry and entry[2] > self._written.get(path, 0):
+                return entry[0]
+        return None
+
+    def write_json(self, path, obj, **dump_kwargs):
+        # Write now, superseding anything buffered or mid-flush for this path
+        with locked(path):
+            with self._lock:
+                generation = self._next_generation()
+                self._dirty.pop(path, None)
+            atomic_write_json(path, obj, lock=False, **dump_kwargs)
+            with self._lock:
+                self._written[path] = generation
+
+    def flush(self):
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            self._flushing = dirty
+        if not dirty:
+            return 0
+        started = time.perf_counter()
+        written = coalesced = 0
+        for path, (obj, count, generation) in dirty.items():
+            try:
+                with locked(path):
+                    with self._lock:
+                        superseded = self._written.get(path, 0) > generation
+                        if superseded:
+                            self._stats["superseded"] += 1
+                    if superseded:
+                        # A direct write_json() with newer data landed after this update was buffered
+                        continue
+                    atomic_write_json(path, obj, lock=False)
+                    with self._lock:
+                        self._written[path] = generation
+                written += 1
+                coalesced += count
+            except OSError as e:
+                print(f"PERSIST ERROR: could not write {path}: {str(e)}")
+                with self._lock:
+                    self._stats["failures"] += 1
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._flushing = {}
+            self._stats["writes"] += written
+            self._stats["flushed_mutations"] += coalesced
+            self._stats["flushes"] += 1
+            self._stats["flush_seconds"] += elapsed
+            self._stats["last_flush_seconds"] = elapsed
+            self._stats["max_flush_seconds"] = max(self._stats["max_flush_seconds"], elapsed)
+        return written
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"PERSIST ERROR: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, pending=len(self._dirty))
+        # Updates absorbed per file write; 1.0 means nothing was coalesced
+        stats["coalescing_ratio"] = stats["flushed_mutations"] / stats["writes"] if stats["writes"] else None
+        stats["avg_flush_seconds"] = stats["flush_seconds"] / stats["flushes"] if stats["flushes"] else None
+        return stats
+
+
+buffer = WriteBehind(FLUSH_INTERVAL)
+atexit.register(buffer.flush)
+
+
+def stats():
+    return buffer.stats()
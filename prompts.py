@@ -0,0 +1,203 @@
+import os
+import re
+
+import metrics
+from chat_context import estimate_tokens
+
+# Prompt templates for every per-request call site. Template text is compacted once (indentation,
+# blank lines and repeated spaces cost input tokens and prefill time but tell the model nothing),
+# user-supplied parts are compacted on every render, and each call site has a token budget.
+# When a render is over budget the template's truncatable fields are cut, in order, until it fits;
+# every overrun is logged. Budgets can be changed with PROMPT_BUDGET_<CALL_SITE>, e.g. PROMPT_BUDGET_MIX_MATCH.
+
+_FIELD = re.compile(r"{(\w+)}")
+
+
+def compact(text):
+    lines = (re.sub(r"[ \t]+", " ", line).strip() for line in str(text).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def count_tokens(text):
+    return estimate_tokens(text)
+
+
+def _shrink(value, rule, keep):
+    if rule == "lines":
+        return "\n".join(value.split("\n")[:keep])
+    if rule == "items":
+        return ", ".join(value.split(", ")[:keep])
+    return value[:keep].rstrip() + "…"  # "chars"
+
+
+def _size(value, rule):
+    if rule == "lines":
+        return len(value.split("\n"))
+    if rule == "items":
+        return len(value.split(", "))
+    return len(value)
+
+
+# Never cut a field below this: a prompt without its subject is worse than an over-budget one
+_MIN_KEEP = {"lines": 1, "items": 1, "chars": 40}
+
+
+class Template:
+    def __init__(self, call_site, text, budget, truncate=()):
+        self.call_site = call_site
+        self.text = compact(text)
+        self.fields = list(dict.fromkeys(_FIELD.findall(self.text)))
+        self.budget = int(os.getenv(f"PROMPT_BUDGET_{call_site.upper()}", budget))
+        # (field, rule) pairs in the order they may be cut; rule is "lines", "items" or "chars"
+        self.truncate = truncate
+        # Fixed cost of the template itself, before any values are filled in
+        self.static_tokens = count_tokens(_FIELD.sub("", self.text.replace("{{", "{").replace("}}", "}")))
+
+    def render(self, **values):
+        values = {k: compact(v) for k, v in values.items()}
+        prompt = self.text.format(**values)
+        tokens = count_tokens(prompt)
+        if tokens <= self.budget:
+            return prompt
+        original = tokens
+        cut = []
+        for field, rule in self.truncate:
+            value = values.get(field, "")
+            low, high = _MIN_KEEP[rule], _size(value, rule) - 1
+            if high < low:
+                continue
+            # Largest part of the field that still fits, by binary search
+            best = low
+            while low <= high:
+                mid = (low + high) // 2
+                if count_tokens(self.text.format(**dict(values, **{field: _shrink(value, rule, mid)}))) <= self.budget:
+                    best, low = mid, mid + 1
+                else:
+                    high = mid - 1
+            values[field] = _shrink(value, rule, best)
+            cut.append(field)
+            prompt = self.text.format(**values)
+            tokens = count_tokens(prompt)
+            if tokens <= self.budget:
+                break
+        action = "truncated" if tokens <= self.budget else "over"
+        print(f"PROMPT BUDGET [{self.call_site}]: {original} tokens > {self.budget}; "
+              f"{'cut ' + ', '.join(cut) if cut else 'nothing to cut'} -> {tokens} tokens")
+        metrics.record_prompt_overrun(self.call_site, action)
+        return prompt
+
+
+# --- Templates ---
+STUDIO = Template("studio", """
+    You are StyleSense, an expert AI Fashion Stylist and Content Creator.
+
+    Goal: Generate engaging, trendy, and platform-specific fashion content based on the user's request and profile.
+
+    Request Details:
+    - Topic: {topic}
+    - Platform: {platform}
+    - Language: {language}
+    - Mood: {mood}
+    - Weather: {weather}
+    - Style Vibes: {style_context}
+
+    User Profile:
+    - Body Type: {body_type}
+    - Skin Tone: {skin_tone}
+    - Gender Preference: {gender}
+
+    Guidelines:
+    - Tone: Stylish, confident, inclusive, and helpful.
+    - {platform} specific optimizations (e.g., hashtags for Instagram, concise constraints for Twitter).
+    - If the platform is Instagram, suggest a caption, a visual description of the outfit/photo, and relevant hashtags.
+    - If the platform is Twitter, keep it punchy and thread-like if needed.
+    - If the platform is WhatsApp, make it personal and shareable.
+    - Suggest outfits that flatter the specific body type and skin tone mentioned.
+    - Consider the weather and mood in the recommendation.
+    """, budget=600, truncate=(("style_context", "items"), ("topic", "chars")))
+
+# Used by both the Streamlit Smart Mirror and the Flask /analyze API
+VISION = Template("vision", """
+    You are a professional fashion stylist and image consultant. Analyze this image deeply.
+
+    1. Identify the person's features:
+       - Estimated Skin Tone (e.g., Warm, Cool, Olive, Fair, Deep)
+       - Body Shape/Type (if visible)
+       - Facial Features/Vibe
+
+    2. Analyze the context/outfit (if present):
+       - Current Style
+       - Colors worn
+       - Occasion fit
+
+    3. PROVIDE STYLING ADVICE:
+       - "What to Wear": Suggest 3 specific outfit ideas that would perfectly suit this person's features.
+       - "Why it Suits": Explain WHY these colors, cuts, and styles work for their specific skin tone and body type.
+
+    4. ADDITIONAL ANALYSIS:
+       - "Style Score": Rate the outfit/look on a scale of 0-100 based on coordination, fit, and trendiness.
+       - "Mood & Vibe": Describe the mood (e.g., "Confident & Edgy", "Relaxed Boho").
+       - "Colors & Patterns": Analyze the color palette and any patterns used.
+
+    Format the output as JSON with keys: "features", "outfit_ideas" (list of strings), "why_it_suits" (string),
+    "style_score" (integer 0-100), "mood_analysis" (string), "color_pattern_analysis" (string).
+    """, budget=400)
+
+MIX_MATCH = Template("mix_match", """
+    Act as a personal stylist.
+    User Profile: {user_profile}
+    Occasion: {occasion}
+    Candidate outfits from the user's wardrobe, best match first:
+    {shortlist}
+    Task: Pick the best of these outfits (or swap pieces between them) and style it.
+    Missing categories in the wardrobe: {missing}.
+    If a key piece is missing, suggest what to buy to complete the look. Explain why this outfit works for the occasion.
+    """, budget=700, truncate=(("shortlist", "lines"),))
+
+# Nothing in the closet combines into an outfit yet: a sample of pieces is enough for shopping advice
+MIX_MATCH_SAMPLE = Template("mix_match_sample", """
+    Act as a personal stylist.
+    User Profile: {user_profile}
+    Occasion: {occasion}
+    Some pieces the user owns: {sample}
+    Missing categories: {missing}
+    Task: Suggest a complete outfit for the occasion built around what they own, and what to buy to complete the look.
+    Explain why this outfit works for the occasion.
+    """, budget=500, truncate=(("sample", "items"),))
+
+TRENDS = Template("trends", """
+    Analyze this fashion trend data trend: '{trend_data}'.
+    Predict if it's rising or falling and give one strategy to wear it.
+    """, budget=300, truncate=(("trend_data", "chars"),))
+
+SUSTAINABILITY = Template("sustainability", """
+    Analyze the sustainability of this fashion item: "{item}".
+
+    Return ONLY a JSON object with:
+    - "score": (1-10 integer, 10 being most eco-friendly)
+    - "reason": (Short 1 sentence explanation)
+    - "tips": (Short 1 sentence tip to make it more sustainable)
+
+    Do not add markdown formatting. Just the JSON string.
+    """, budget=200, truncate=(("item", "chars"),))
+
+# Not truncatable: every listed item needs its own answer, so an overrun is only logged
+SUSTAINABILITY_BATCH = Template("sustainability_batch", """
+    Analyze the sustainability of each fashion item below.
+
+    {listing}
+
+    Return ONLY a JSON object {{"items": [...]}} with one entry per item, in the same order, each with:
+    - "index": (the item number)
+    - "score": (1-10 integer, 10 being most eco-friendly)
+    - "reason": (Short 1 sentence explanation)
+    - "tips": (Short 1 sentence tip to make it more sustainable)
+    """, budget=4000)
+
+TEMPLATES = [STUDIO, VISION, MIX_MATCH, MIX_MATCH_SAMPLE, TRENDS, SUSTAINABILITY, SUSTAINABILITY_BATCH]
+
+
+def template_report():
+    # Fixed token cost and budget of every template, for the Metrics page
+    return [{"call_site": t.call_site, "fields": ", ".join(t.fields) or "-", "template_tokens": t.static_tokens,
+             "budget": t.budget} for t in TEMPLATES]
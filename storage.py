@@ -0,0 +1,364 @@
+import copy
+import json
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import history_log
+
+DB_FILE = os.getenv("STYLESENSE_DB", "stylesense.db")
+LEGACY_DATA_FILE = "data.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    username TEXT PRIMARY KEY REFERENCES users(username) ON DELETE CASCADE,
+    body_type TEXT,
+    skin_tone TEXT,
+    gender TEXT
+);
+CREATE TABLE IF NOT EXISTS wardrobe_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    item TEXT NOT NULL,
+    category TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_wardrobe_username ON wardrobe_items(username);
+CREATE INDEX IF NOT EXISTS idx_wardrobe_category ON wardrobe_items(username, category, id);
+-- Running per-category counts, kept in step by triggers so stats never need a scan
+CREATE TABLE IF NOT EXISTS wardrobe_counts (
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    category TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (username, category)
+);
+CREATE TRIGGER IF NOT EXISTS trg_wardrobe_count_add AFTER INSERT ON wardrobe_items BEGIN
+    INSERT INTO wardrobe_counts (username, category, count) VALUES (NEW.username, NEW.category, 1)
+    ON CONFLICT(username, category) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_wardrobe_count_remove AFTER DELETE ON wardrobe_items BEGIN
+    UPDATE wardrobe_counts SET count = count - 1 WHERE username = OLD.username AND category = OLD.category;
+END;
+CREATE TABLE IF NOT EXISTS migrations (
+    source TEXT PRIMARY KEY,
+    migrated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+PROFILE_FIELDS = ("body_type", "skin_tone", "gender")
+READ_CACHE_MAX_ENTRIES = int(os.getenv("STORAGE_READ_CACHE_ENTRIES", 2048))
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+# Streamlit reruns the whole script on every click, so the same user, profile and wardrobe views
+# are read over and over. They are cached per process and dropped whenever the database files
+# change on disk (any writer, any process) or this process writes.
+_read_cache = OrderedDict()
+_read_cache_lock = threading.Lock()
+_read_cache_stamp = None
+_read_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+# --- Connection Management ---
+def get_connection():
+    # Streamlit runs every session in its own thread, so each thread gets its own connection
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_FILE, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        # Only hand the connection out once the schema and any migration are in place
+        init_db(conn)
+        _local.conn = conn
+    return conn
+
+
+def init_db(conn):
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        has_counts = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'wardrobe_counts'").fetchone()[0] > 0
+        conn.executescript(SCHEMA)
+        if not has_counts:
+            # Wardrobes stored before running counts existed
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO wardrobe_counts (username, category, count) "
+                    "SELECT username, category, COUNT(*) FROM wardrobe_items GROUP BY username, category"
+                )
+        _move_history_table_to_log(conn)
+        # First start on an existing install: pull in the old data.json once. Checked on the users table
+        # rather than on a fresh schema, so a migration that failed is retried on the next connection.
+        is_empty = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0
+        if is_empty and os.path.exists(LEGACY_DATA_FILE):
+            migrate_from_json(LEGACY_DATA_FILE, conn)
+        # Other sessions check this without the lock: set it only once the database is ready to read
+        _initialized = True
+
+
+# --- Read Cache ---
+def _db_stamp():
+    # WAL commits grow or rewrite the -wal file; checkpoints rewrite the main file
+    stamp = []
+    for path in (DB_FILE, DB_FILE + "-wal"):
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def _invalidate():
+    global _read_cache_stamp
+    with _read_cache_lock:
+        _read_cache.clear()
+        _read_cache_stamp = None
+        _read_cache_stats["invalidations"] += 1
+
+
+def _cached_read(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        global _read_cache_stamp
+        key = (func.__name__,) + args + tuple(sorted(kwargs.items()))
+        stamp = _db_stamp()
+        with _read_cache_lock:
+            if stamp != _read_cache_stamp:
+                if _read_cache:
+                    _read_cache_stats["invalidations"] += 1
+                _read_cache.clear()
+                _read_cache_stamp = stamp
+            if key in _read_cache:
+                _read_cache.move_to_end(key)
+                _read_cache_stats["hits"] += 1
+                # Callers get their own copy, so editing a returned profile can't poison the cache
+                return copy.deepcopy(_read_cache[key])
+            _read_cache_stats["misses"] += 1
+        value = func(*args, **kwargs)
+        with _read_cache_lock:
+            # Only keep it if nothing changed while it was being read
+            if _read_cache_stamp == stamp:
+                _read_cache[key] = copy.deepcopy(value)
+                while len(_read_cache) > READ_CACHE_MAX_ENTRIES:
+                    _read_cache.popitem(last=False)
+        return value
+    return wrapper
+
+
+def read_cache_stats():
+    with _read_cache_lock:
+        return dict(_read_cache_stats, entries=len(_read_cache))
+
+
+# --- Point Reads / Writes ---
+@_cached_read
+def get_user(username):
+    row = get_connection().execute(
+        "SELECT u.username, u.password, p.body_type, p.skin_tone, p.gender "
+        "FROM users u LEFT JOIN profiles p ON p.username = u.username WHERE u.username = ?",
+        (username,),
+    ).fetchone()
+    if row is None:
+        return None
+    return {"password": row["password"], "profile": _profile_from_row(row)}
+
+
+@_cached_read
+def user_exists(username):
+    row = get_connection().execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone()
+    return row is not None
+
+
+def create_user(username, password_hash, profile):
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password_hash))
+            _upsert_profile(conn, username, profile)
+    except sqlite3.IntegrityError:
+        return False
+    finally:
+        _invalidate()
+    return True
+
+
+@_cached_read
+def get_profile(username):
+    row = get_connection().execute(
+        "SELECT body_type, skin_tone, gender FROM profiles WHERE username = ?", (username,)
+    ).fetchone()
+    return _profile_from_row(row) if row else {}
+
+
+def update_profile(username, profile):
+    conn = get_connection()
+    with conn:
+        _upsert_profile(conn, username, profile)
+    _invalidate()
+
+
+@_cached_read
+def get_wardrobe(username, category=None):
+    if category is None:
+        rows = get_connection().execute(
+            "SELECT id, item, category FROM wardrobe_items WHERE username = ? ORDER BY id", (username,)
+        ).fetchall()
+    else:
+        rows = get_connection().execute(
+            "SELECT id, item, category FROM wardrobe_items WHERE username = ? AND category = ? ORDER BY id",
+            (username, category),
+        ).fetchall()
+    return [_wardrobe_from_row(r) for r in rows]
+
+
+@_cached_read
+def get_wardrobe_page(username, category, page, page_size):
+    # One page of one category, straight off the (username, category, id) index
+    rows = get_connection().execute(
+        "SELECT id, item, category FROM wardrobe_items WHERE username = ? AND category = ? "
+        "ORDER BY id DESC LIMIT ? OFFSET ?",
+        (username, category, page_size, page * page_size),
+    ).fetchall()
+    return [_wardrobe_from_row(r) for r in rows]
+
+
+@_cached_read
+def get_wardrobe_counts(username):
+    rows = get_connection().execute(
+        "SELECT category, count FROM wardrobe_counts WHERE username = ? AND count > 0", (username,)
+    ).fetchall()
+    return {r["category"]: r["count"] for r in rows}
+
+
+def add_wardrobe_item(username, item, category):
+    conn = get_connection()
+    with conn:
+        cur = conn.execute(
+            "INSERT INTO wardrobe_items (username, item, category) VALUES (?, ?, ?)",
+            (username, item, category),
+        )
+    _invalidate()
+    return cur.lastrowid
+
+
+def remove_wardrobe_item(username, item_id):
+    conn = get_connection()
+    with conn:
+        cur = conn.execute("DELETE FROM wardrobe_items WHERE id = ? AND username = ?", (item_id, username))
+    _invalidate()
+    return cur.rowcount > 0
+
+
+# --- Whole-Dataset API (same shape as the old data.json) ---
+def load_data():
+    conn = get_connection()
+    users = {}
+    for row in conn.execute(
+        "SELECT u.username, u.password, p.body_type, p.skin_tone, p.gender "
+        "FROM users u LEFT JOIN profiles p ON p.username = u.username"
+    ):
+        users[row["username"]] = {"password": row["password"], "profile": _profile_from_row(row), "wardrobe": []}
+    for row in conn.execute("SELECT username, item, category FROM wardrobe_items ORDER BY id"):
+        if row["username"] in users:
+            users[row["username"]]["wardrobe"].append({"item": row["item"], "category": row["category"]})
+    return {"users": users, "history": history_log.read_all()}
+
+
+def save_data(data):
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM users")
+        _insert_dataset(conn, data)
+    _invalidate()
+    history_log.replace_all(data.get("history", []))
+
+
+def migrate_from_json(path=LEGACY_DATA_FILE, conn=None):
+    # One-shot: a source file that was already imported is skipped so history is never duplicated
+    source = os.path.abspath(path)
+    conn = conn or get_connection()
+    if conn.execute("SELECT 1 FROM migrations WHERE source = ?", (source,)).fetchone():
+        return None
+    with open(path, "r") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError:
+            data = {"users": {}, "history": []}
+    with conn:
+        _insert_dataset(conn, data, skip_existing=True)
+        conn.execute("INSERT INTO migrations (source) VALUES (?)", (source,))
+    _invalidate()
+    history_log.append_many(data.get("history", []))
+    return len(data.get("users", {})), len(data.get("history", []))
+
+
+# --- Helpers ---
+def _insert_dataset(conn, data, skip_existing=False):
+    verb = "INSERT OR IGNORE" if skip_existing else "INSERT"
+    for username, user in data.get("users", {}).items():
+        cur = conn.execute(f"{verb} INTO users (username, password) VALUES (?, ?)", (username, user["password"]))
+        if cur.rowcount == 0:
+            continue
+        _upsert_profile(conn, username, user.get("profile", {}))
+        conn.executemany(
+            "INSERT INTO wardrobe_items (username, item, category) VALUES (?, ?, ?)",
+            [(username, w["item"], w["category"]) for w in user.get("wardrobe", [])],
+        )
+
+
+def _move_history_table_to_log(conn):
+    # Databases created before history moved to history_log.py kept it in a table
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history'").fetchone():
+        return
+    rows = conn.execute("SELECT username, topic, platform, language, content, timestamp FROM history ORDER BY id")
+    history_log.append_many([
+        {"user": r["username"], "topic": r["topic"], "platform": r["platform"], "language": r["language"],
+         "content": r["content"], "timestamp": r["timestamp"]}
+        for r in rows
+    ])
+    with conn:
+        conn.execute("DROP TABLE history")
+
+
+def _upsert_profile(conn, username, profile):
+    conn.execute(
+        "INSERT INTO profiles (username, body_type, skin_tone, gender) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(username) DO UPDATE SET body_type = excluded.body_type, "
+        "skin_tone = excluded.skin_tone, gender = excluded.gender",
+        (username,) + tuple(profile.get(f) for f in PROFILE_FIELDS),
+    )
+
+
+def _wardrobe_from_row(row):
+    return {"id": row["id"], "item": row["item"], "category": row["category"]}
+
+
+def _profile_from_row(row):
+    return {f: row[f] for f in PROFILE_FIELDS if row[f] is not None}
+
+
+if __name__ == "__main__":
+    # Usage: python storage.py migrate [path/to/data.json]
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        source = sys.argv[2] if len(sys.argv) > 2 else LEGACY_DATA_FILE
+        counts = migrate_from_json(source)
+        if counts is None:
+            print(f"{source} was already migrated into {DB_FILE}")
+        else:
+            print(f"Migrated {counts[0]} users and {counts[1]} history entries from {source} into {DB_FILE}")
+    else:
+        print("Usage: python storage.py migrate [path/to/data.json]")
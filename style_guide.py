@@ -0,0 +1,164 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from itertools import product
+
+from dotenv import load_dotenv
+
+import groq_client
+import persistence
+
+# Signup only offers these values, so every Style Guide answer can be generated ahead of time
+BODY_TYPES = ["Hourglass", "Pear", "Apple", "Rectangle", "Inverted Triangle", "Athletic"]
+SKIN_TONES = ["Warm", "Cool", "Neutral", "Olive", "Deep"]
+GENDERS = ["Female", "Male", "Unisex"]
+
+MODEL = "llama-3.3-70b-versatile"
+STORE_FILE = os.getenv("STYLE_GUIDE_FILE", "style_guide.json")
+
+_lock = threading.Lock()
+_store = {"mtime": None, "data": None}
+
+
+def build_prompt(request_type, user_profile):
+    if request_type == "dos_donts":
+        return f"""
+        Generate a concise list of 5 Fashion DOs and 5 Fashion DON'Ts specifically for:
+        Body Type: {user_profile.get('body_type')}
+        Skin Tone: {user_profile.get('skin_tone')}
+        Gender: {user_profile.get('gender')}
+
+        Format as clear markdown bullet points.
+        Focus on cuts, colors, and styling tricks.
+        """
+    elif request_type == "trends":
+        return f"""
+        What are the top 3 current fashion trends suitable for:
+        Gender: {user_profile.get('gender')}
+
+        Briefly explain each and why it works.
+        """
+    raise ValueError(f"Unknown style guide request: {request_type}")
+
+
+# Stored answers from an older prompt or model are ignored, so changing either invalidates the matrix
+PROMPT_VERSION = hashlib.sha1(
+    (MODEL + build_prompt("dos_donts", {}) + build_prompt("trends", {})).encode("utf-8")
+).hexdigest()[:12]
+
+
+def entry_key(request_type, user_profile):
+    if request_type == "trends":
+        return f"trends|{user_profile.get('gender')}"
+    return f"dos_donts|{user_profile.get('body_type')}|{user_profile.get('skin_tone')}|{user_profile.get('gender')}"
+
+
+def all_combinations():
+    for body_type, skin_tone, gender in product(BODY_TYPES, SKIN_TONES, GENDERS):
+        yield "dos_donts", {"body_type": body_type, "skin_tone": skin_tone, "gender": gender}
+    for gender in GENDERS:
+        yield "trends", {"gender": gender}
+
+
+def generate_advice(request_type, user_profile):
+    completion = groq_client.chat_completion(
+        call_site="style_guide",
+        messages=[{"role": "user", "content": build_prompt(request_type, user_profile)}],
+        model=MODEL,
+        temperature=0.7,
+    )
+    return completion.choices[0].message.content
+
+
+# --- Store ---
+def load_store():
+    # Parsed once per change of the file on disk
+    try:
+        mtime = os.path.getmtime(STORE_FILE)
+    except OSError:
+        return {"entries": {}}
+    with _lock:
+        if _store["mtime"] != mtime:
+            try:
+                with open(STORE_FILE, "r") as f:
+                    _store["data"] = json.load(f)
+            except json.JSONDecodeError:
+                _store["data"] = {"entries": {}}
+            _store["mtime"] = mtime
+        return _store["data"]
+
+
+def save_entries(new_entries):
+    # Read-modify-write under the file lock, so a live miss and a cron precompute can't drop each other's entries
+    with persistence.locked(STORE_FILE):
+        try:
+            with open(STORE_FILE, "r") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            data = {"entries": {}}
+        data["entries"].update(new_entries)
+        data["version"] = PROMPT_VERSION
+        data["model"] = MODEL
+        data["updated_at"] = time.time()
+        persistence.atomic_write_json(STORE_FILE, data, lock=False, indent=4)
+
+
+def lookup(request_type, user_profile):
+    entry = load_store()["entries"].get(entry_key(request_type, user_profile))
+    if entry and entry.get("version") == PROMPT_VERSION:
+        return entry["advice"]
+    return None
+
+
+def remember(request_type, user_profile, advice):
+    save_entries({entry_key(request_type, user_profile): {
+        "advice": advice, "version": PROMPT_VERSION, "generated_at": time.time(),
+    }})
+
+
+# --- Offline precompute ---
+def precompute(max_age_days=None, force=False, only=None):
+    entries = load_store()["entries"]
+    now = time.time()
+    done = skipped = failed = 0
+    for request_type, profile in all_combinations():
+        if only and request_type != only:
+            continue
+        key = entry_key(request_type, profile)
+        entry = entries.get(key)
+        fresh = (
+            entry is not None
+            and entry.get("version") == PROMPT_VERSION
+            and (max_age_days is None or now - entry.get("generated_at", 0) < max_age_days * 86400)
+        )
+        if fresh and not force:
+            skipped += 1
+            continue
+        try:
+            advice = generate_advice(request_type, profile)
+        except Exception as e:
+            print(f"FAILED {key}: {str(e)}")
+            failed += 1
+            continue
+        # Saved one by one so an interrupted run keeps its progress
+        remember(request_type, profile, advice)
+        done += 1
+        print(f"generated {key}")
+    print(f"Style guide matrix: {done} generated, {skipped} up to date, {failed} failed (version {PROMPT_VERSION})")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    # Run from cron for scheduled regeneration, e.g. weekly trends and monthly rules:
+    #   python style_guide.py --only trends --max-age-days 7
+    #   python style_guide.py --max-age-days 30
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Precompute Style Guide advice for every profile combination.")
+    parser.add_argument("--max-age-days", type=float, default=None, help="regenerate entries older than this")
+    parser.add_argument("--only", choices=["dos_donts", "trends"], help="limit to one kind of advice")
+    parser.add_argument("--force", action="store_true", help="regenerate everything")
+    args = parser.parse_args()
+    raise SystemExit(0 if precompute(args.max_age_days, args.force, args.only) else 1)
@@ -0,0 +1,194 @@
+import json
+import os
+import re
+
+import groq_client
+import metrics
+import prompts
+import response_cache
+
+MODEL = "llama-3.3-70b-versatile"
+
+# Unresolved wardrobe items per batch request; keeps every JSON answer well inside the output limit
+BATCH_SIZE = int(os.getenv("SUSTAINABILITY_BATCH_SIZE", 50))
+BATCH_TOKENS_PER_ITEM = 60
+
+# Material / sourcing keywords -> (eco score 1-10, reason, tip). Multi-word phrases are matched first,
+# so "organic cotton" or "recycled polyester" win over plain "cotton" / "polyester".
+LEXICON = {
+    "organic cotton": (8, "Organic cotton skips synthetic pesticides and uses far less water.", "Look for GOTS certification."),
+    "recycled polyester": (6, "Recycled polyester reuses plastic but still sheds microfibres.", "Wash cold in a microfibre-catching bag."),
+    "recycled cotton": (8, "Recycled cotton keeps fibre out of landfill and needs no new crops.", "Pair it with other recycled pieces."),
+    "vegan leather": (4, "Most vegan leather is PU plastic: animal-free but fossil-based.", "Prefer plant-based alternatives like cactus or apple leather."),
+    "faux fur": (3, "Faux fur is acrylic or polyester and is rarely recyclable.", "Buy it second-hand and keep it for years."),
+    "fast fashion": (2, "Fast-fashion pieces are made to be replaced quickly.", "Choose fewer, better-made pieces."),
+    "second hand": (9, "Buying second-hand adds no new production impact.", "Keep the cycle going by reselling what you no longer wear."),
+    "second-hand": (9, "Buying second-hand adds no new production impact.", "Keep the cycle going by reselling what you no longer wear."),
+    "pre-loved": (9, "Pre-loved pieces add no new production impact.", "Keep the cycle going by reselling what you no longer wear."),
+    "thrifted": (9, "Thrifted pieces add no new production impact.", "Keep the cycle going by reselling what you no longer wear."),
+    "vintage": (9, "Vintage clothing extends the life of existing garments.", "Care for it gently so it lasts another generation."),
+    "upcycled": (9, "Upcycling turns waste into new garments.", "Support small upcycling makers."),
+    "deadstock": (8, "Deadstock fabric uses material that would otherwise be discarded.", "Ask brands where their deadstock comes from."),
+    "recycled": (7, "Recycled fibres reduce demand for virgin material.", "Check the recycled percentage on the label."),
+    "hemp": (9, "Hemp grows fast with little water and no pesticides.", "Hemp softens with every wash, so keep it for years."),
+    "linen": (8, "Linen comes from flax, which needs little water or pesticide.", "Air-dry it to save energy."),
+    "tencel": (8, "Tencel lyocell is made in a closed-loop solvent process.", "Wash cool and line dry."),
+    "lyocell": (8, "Lyocell is made in a closed-loop solvent process.", "Wash cool and line dry."),
+    "bamboo": (5, "Bamboo grows fast, but bamboo viscose uses harsh chemicals.", "Prefer mechanically processed bamboo linen."),
+    "merino": (6, "Merino is renewable and durable but has a land and methane footprint.", "Look for mulesing-free certification."),
+    "wool": (6, "Wool is renewable and long-lasting but animal-farmed.", "Air it out instead of washing often."),
+    "cashmere": (4, "Cashmere goat grazing drives grassland degradation.", "Choose recycled cashmere."),
+    "silk": (5, "Silk is natural but energy-intensive to produce.", "Look for peace silk or second-hand."),
+    "cotton": (5, "Conventional cotton is water- and pesticide-intensive.", "Switch to organic or recycled cotton."),
+    "denim": (4, "Denim production uses lots of water and dye chemicals.", "Wash jeans rarely and buy second-hand."),
+    "jeans": (4, "Denim production uses lots of water and dye chemicals.", "Wash jeans rarely and buy second-hand."),
+    "leather": (3, "Leather tanning is chemical-heavy and tied to cattle farming.", "Buy second-hand or vegetable-tanned leather and keep it long."),
+    "polyester": (2, "Polyester is fossil-based and sheds microplastics.", "Choose recycled polyester or natural fibres."),
+    "nylon": (2, "Nylon is fossil-based and energy-intensive.", "Look for regenerated nylon such as ECONYL."),
+    "acrylic": (2, "Acrylic is fossil-based and sheds heavily.", "Choose wool or recycled blends instead."),
+    "spandex": (3, "Spandex makes garments hard to recycle.", "Prefer low-stretch or mono-material pieces."),
+    "elastane": (3, "Elastane makes garments hard to recycle.", "Prefer low-stretch or mono-material pieces."),
+    "viscose": (4, "Viscose often comes from deforested pulp and toxic processing.", "Look for FSC-certified or EcoVero viscose."),
+    "rayon": (4, "Rayon often comes from deforested pulp and toxic processing.", "Look for FSC-certified or EcoVero rayon."),
+    "pvc": (1, "PVC is one of the most polluting plastics.", "Avoid PVC; choose coated cotton instead."),
+}
+
+# Reuse beats any fibre: an already-made garment adds no new production impact
+SOURCING = {"second hand", "second-hand", "pre-loved", "thrifted", "vintage", "upcycled", "deadstock"}
+
+# Words that mean the text describes a garment at all. Garments without a known material are ambiguous.
+GARMENTS = {
+    "shirt", "t-shirt", "tee", "top", "blouse", "sweater", "jumper", "hoodie", "cardigan", "jacket", "coat",
+    "blazer", "dress", "skirt", "jeans", "trousers", "pants", "shorts", "leggings", "suit", "vest", "kurta",
+    "saree", "sari", "shoes", "sneakers", "boots", "heels", "sandals", "loafers", "bag", "handbag", "scarf",
+    "hat", "belt", "jumpsuit", "romper", "swimsuit", "bikini", "lehenga", "tank", "polo", "parka", "trench",
+}
+
+_PHRASES = sorted(LEXICON, key=len, reverse=True)
+
+
+def normalize(item):
+    return response_cache.normalize_text(item)
+
+
+def local_score(item):
+    # Returns (result, kind): kind is "confident", "ambiguous" (a garment, material unknown) or "not_item"
+    text = normalize(item)
+    matched = []
+    for phrase in _PHRASES:
+        pattern = r"(?<![\w-])" + re.escape(phrase) + r"(?![\w-])"
+        if re.search(pattern, text):
+            matched.append(phrase)
+            text = re.sub(pattern, " ", text)
+    sourced = [m for m in matched if m in SOURCING]
+    if sourced:
+        best = max(sourced, key=lambda m: LEXICON[m][0])
+        return {"score": LEXICON[best][0], "reason": LEXICON[best][1], "tips": LEXICON[best][2], "source": "local"}, "confident"
+    if matched:
+        scores = [LEXICON[m][0] for m in matched]
+        # Blends are only as good as their weakest fibre allows: lean towards the lower score
+        score = round((sum(scores) / len(scores) + min(scores)) / 2)
+        worst = min(matched, key=lambda m: LEXICON[m][0])
+        best = max(matched, key=lambda m: LEXICON[m][0])
+        return {"score": score, "reason": LEXICON[best][1] if score >= 7 else LEXICON[worst][1],
+                "tips": LEXICON[worst][2], "source": "local"}, "confident"
+    words = set(re.findall(r"[a-z-]+", text))
+    if words & GARMENTS or {w.rstrip("s") for w in words} & GARMENTS:
+        return None, "ambiguous"
+    return None, "not_item"
+
+
+def _cache():
+    return response_cache.get_cache("sustainability")
+
+
+def _memo_key(item):
+    return response_cache.make_key("sustainability", model=MODEL, item=normalize(item))
+
+
+def _llm_score(item):
+    prompt = prompts.SUSTAINABILITY.render(item=item)
+    completion = groq_client.chat_completion(
+        call_site="sustainability",
+        messages=[{"role": "user", "content": prompt}],
+        model=MODEL,
+        temperature=0.2,
+        response_format={"type": "json_object"}
+    )
+    return json.loads(completion.choices[0].message.content)
+
+
+def score_item(item, use_llm=True):
+    # None means the text is not a fashion item at all, so there is nothing to score
+    result, kind = local_score(item)
+    if kind == "confident":
+        return result
+    if kind == "not_item":
+        return None
+    cached = _cache().get(_memo_key(item))
+    metrics.record_cache("sustainability", cached is not None)
+    if cached is not None:
+        return cached
+    if not use_llm:
+        return None
+    result = _llm_score(item)
+    result["source"] = "ai"
+    _cache().set(_memo_key(item), result)
+    return result
+
+
+def _llm_score_batch(names):
+    listing = "\n".join(f"{i + 1}. {name}" for i, name in enumerate(names))
+    prompt = prompts.SUSTAINABILITY_BATCH.render(listing=listing)
+    completion = groq_client.chat_completion(
+        call_site="sustainability_batch",
+        messages=[{"role": "user", "content": prompt}],
+        model=MODEL,
+        temperature=0.2,
+        max_tokens=100 + BATCH_TOKENS_PER_ITEM * len(names),
+        response_format={"type": "json_object"}
+    )
+    results = {}
+    for entry in json.loads(completion.choices[0].message.content).get("items", []):
+        index = entry.get("index")
+        if not isinstance(index, int) or not 1 <= index <= len(names):
+            continue
+        results[names[index - 1]] = {"score": entry.get("score", 5), "reason": entry.get("reason"),
+                                     "tips": entry.get("tips"), "source": "ai"}
+    return results
+
+
+def score_items(items):
+    # Scores a whole wardrobe: lexicon first, memo second, then batched requests for everything left.
+    # A failed batch leaves its items as None; everything else is still returned.
+    results = {}
+    seen = set()
+    unresolved = []
+    for item in items:
+        key = normalize(item)
+        if key in seen:
+            continue
+        seen.add(key)
+        result, kind = local_score(item)
+        if kind == "confident":
+            results[key] = result
+            continue
+        cached = _cache().get(_memo_key(item))
+        metrics.record_cache("sustainability_batch", cached is not None)
+        if cached is not None:
+            results[key] = cached
+        else:
+            unresolved.append(key)
+
+    for start in range(0, len(unresolved), BATCH_SIZE):
+        chunk = unresolved[start:start + BATCH_SIZE]
+        try:
+            scored = _llm_score_batch(chunk)
+        except Exception as e:
+            print(f"SUSTAINABILITY BATCH ERROR: {str(e)}")
+            continue
+        for key, result in scored.items():
+            results[key] = result
+            _cache().set(_memo_key(key), result)
+
+    return {item: results.get(normalize(item)) for item in items}
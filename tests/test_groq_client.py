@@ -0,0 +1,210 @@
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from groq import BadRequestError, InternalServerError
+
+import groq_client
+from groq_client import CircuitBreaker, ProviderUnavailable, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(time, "sleep", clock.sleep)
+    return clock
+
+
+@pytest.fixture
+def limiter(clock, monkeypatch):
+    # Fresh breaker and buckets per test; every take() is recorded
+    breaker = CircuitBreaker(threshold=2, cooldown=30)
+    requests = TokenBucket(600)
+    tokens = TokenBucket(600000)
+    takes = []
+    original = requests.take
+
+    def take(amount=1, max_wait=groq_client.LIMITER_MAX_WAIT):
+        takes.append(amount)
+        return original(amount, max_wait)
+
+    requests.take = take
+    monkeypatch.setattr(groq_client, "breaker", breaker)
+    monkeypatch.setattr(groq_client, "request_bucket", requests)
+    monkeypatch.setattr(groq_client, "token_bucket", tokens)
+    monkeypatch.setattr(groq_client, "backoff_delay", lambda attempt, retry_after=None: 0.01)
+    return SimpleNamespace(breaker=breaker, requests=requests, takes=takes)
+
+
+def fake_client(monkeypatch, *outcomes):
+    # Each create() call returns or raises the next outcome
+    outcomes = list(outcomes)
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(groq_client, "get_client", lambda: client)
+    return calls
+
+
+def status_error(cls, status):
+    response = httpx.Response(status, request=httpx.Request("POST", "http://groq.test/chat/completions"))
+    return cls(f"status {status}", response=response, body=None)
+
+
+def half_open(breaker, clock):
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += breaker.cooldown
+    assert breaker.state == "half_open"
+
+
+REQUEST = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+
+
+# --- CircuitBreaker ---
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=30)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.rejecting
+
+
+def test_breaker_lets_one_trial_through_when_half_open(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=30)
+    half_open(breaker, clock)
+    assert not breaker.rejecting
+    assert breaker.allow()
+    assert not breaker.allow()
+    assert breaker.rejecting
+
+
+def test_breaker_trial_success_closes(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=30)
+    half_open(breaker, clock)
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_trial_failure_reopens_for_a_full_cooldown(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=30)
+    half_open(breaker, clock)
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_release_frees_the_trial_without_closing(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=30)
+    half_open(breaker, clock)
+    breaker.allow()
+    breaker.release()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+# --- TokenBucket ---
+def test_bucket_waits_for_refill_within_deadline(clock):
+    bucket = TokenBucket(60)  # one token per second
+    bucket.take(60)
+    started = clock.now
+    bucket.take(2, max_wait=5)
+    assert clock.now - started == pytest.approx(2)
+
+
+def test_bucket_rejects_when_refill_is_past_deadline(clock):
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    started = clock.now
+    with pytest.raises(ProviderUnavailable):
+        bucket.take(10, max_wait=5)
+    assert clock.now == started  # fails fast instead of sleeping up to the deadline
+
+
+def test_bucket_with_no_capacity_is_unlimited(clock):
+    bucket = TokenBucket(0)
+    for _ in range(100):
+        bucket.take(1000, max_wait=0)
+
+
+# --- _create_with_retries ---
+def test_every_retry_takes_from_the_limiter(limiter, monkeypatch):
+    calls = fake_client(monkeypatch, status_error(InternalServerError, 503), status_error(InternalServerError, 503), "ok")
+    attempts = {"retries": 0}
+    assert groq_client._create_with_retries("test", attempts, dict(REQUEST)) == "ok"
+    assert len(calls) == 3
+    assert len(limiter.takes) == 3
+    assert attempts["retries"] == 2
+    assert limiter.breaker.state == "closed"
+
+
+def test_exhausted_retries_count_as_one_provider_failure(limiter, monkeypatch):
+    errors = [status_error(InternalServerError, 503) for _ in range(groq_client.MAX_RETRIES + 1)]
+    fake_client(monkeypatch, *errors)
+    with pytest.raises(InternalServerError):
+        groq_client._create_with_retries("test", {"retries": 0}, dict(REQUEST))
+    assert limiter.breaker.failures == 1
+    assert len(limiter.takes) == groq_client.MAX_RETRIES + 1
+
+
+def test_limiter_rejection_in_half_open_releases_the_trial(limiter, clock, monkeypatch):
+    half_open(limiter.breaker, clock)
+    fake_client(monkeypatch, "ok")
+
+    def reject(*args, **kwargs):
+        raise ProviderUnavailable("limit")
+
+    limiter.requests.take = reject
+    with pytest.raises(ProviderUnavailable):
+        groq_client._create_with_retries("test", {"retries": 0}, dict(REQUEST))
+    assert limiter.breaker.state == "half_open"
+    assert not limiter.breaker.trial_in_flight
+    assert limiter.breaker.allow()
+
+
+@pytest.mark.parametrize("error", [status_error(BadRequestError, 400), TypeError("bad kwargs")])
+def test_errors_that_are_not_the_providers_fault_leave_the_breaker_alone(limiter, clock, monkeypatch, error):
+    half_open(limiter.breaker, clock)
+    calls = fake_client(monkeypatch, error)
+    with pytest.raises(type(error)):
+        groq_client._create_with_retries("test", {"retries": 0}, dict(REQUEST))
+    assert len(calls) == 1  # not retried
+    assert limiter.breaker.state == "half_open"  # neither closed nor counted as a failure
+    assert not limiter.breaker.trial_in_flight
+
+
+def test_open_breaker_fails_fast_without_calling(limiter, monkeypatch):
+    limiter.breaker.record_failure()
+    limiter.breaker.record_failure()
+    calls = fake_client(monkeypatch, "ok")
+    with pytest.raises(ProviderUnavailable):
+        groq_client._create_with_retries("test", {"retries": 0}, dict(REQUEST))
+    assert calls == [] and limiter.takes == []
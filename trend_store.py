@@ -0,0 +1,156 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from pytrends.request import TrendReq
+
+import persistence
+from response_cache import CACHE_DIR
+
+# Google Trends data only changes daily, so series are kept on disk and served from there.
+# Each keyword set gets a columnar .npz (one array per column) plus a small .json with freshness metadata.
+TREND_DIR = os.path.join(CACHE_DIR, "trends")
+TTL = float(os.getenv("TREND_TTL_HOURS", 24)) * 3600
+REFRESH_INTERVAL = float(os.getenv("TREND_REFRESH_INTERVAL_MINUTES", 60)) * 60
+REFRESH_TOP_N = int(os.getenv("TREND_REFRESH_TOP_N", 20))
+REFRESH_SPACING = float(os.getenv("TREND_REFRESH_SPACING_SECONDS", 5))
+TIMEFRAME = "today 12-m"
+
+_lock = threading.Lock()
+_frames = {}
+_refresher = None
+
+
+def _key(keywords):
+    normalized = [" ".join(k.split()) for k in keywords]
+    slug = hashlib.sha1("|".join(k.lower() for k in normalized).encode("utf-8")).hexdigest()[:16]
+    return slug, normalized
+
+
+def _paths(slug):
+    base = os.path.join(TREND_DIR, slug)
+    return base + ".npz", base + ".json"
+
+
+def fetch(keywords):
+    pytrends = TrendReq(hl='en-US', tz=360)
+    pytrends.build_payload(keywords, cat=0, timeframe=TIMEFRAME, geo='', gprop='')
+    return pytrends.interest_over_time()
+
+
+def _write(slug, keywords, frame, meta):
+    os.makedirs(TREND_DIR, exist_ok=True)
+    data_path, meta_path = _paths(slug)
+    columns = {"__index__": frame.index.values.astype("datetime64[ns]")}
+    for i, column in enumerate(frame.columns):
+        columns[f"c{i}"] = frame[column].to_numpy()
+    meta = dict(meta, keywords=keywords, columns=[str(c) for c in frame.columns], fetched_at=time.time(), rows=len(frame))
+    # Write-then-rename so a reader never sees a half-written file
+    buf = io.BytesIO()
+    np.savez(buf, **columns)
+    persistence.atomic_write(data_path, buf.getvalue())
+    # Through the buffer, so a pending or in-flight hit-count update can't overwrite it with older metadata
+    persistence.buffer.write_json(meta_path, meta)
+    return meta
+
+
+def _read_meta(slug):
+    pending = persistence.buffer.pending(_paths(slug)[1])
+    if pending is not None:
+        return dict(pending)
+    try:
+        with open(_paths(slug)[1], "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _read_frame(slug, meta):
+    data_path = _paths(slug)[0]
+    mtime = os.path.getmtime(data_path)
+    with _lock:
+        cached = _frames.get(slug)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    with np.load(data_path) as columns:
+        index = pd.DatetimeIndex(columns["__index__"], name="date")
+        frame = pd.DataFrame({name: columns[f"c{i}"] for i, name in enumerate(meta["columns"])}, index=index)
+    with _lock:
+        _frames[slug] = (mtime, frame)
+    return frame
+
+
+def _bump_hits(slug, meta):
+    meta["hits"] = meta.get("hits", 0) + 1
+    meta["last_requested"] = time.time()
+    # Every chart view bumps the counter; write-behind turns a burst of views into one file write
+    persistence.buffer.put_json(_paths(slug)[1], meta)
+
+
+def refresh(keywords):
+    slug, keywords = _key(keywords)
+    frame = fetch(keywords)
+    if frame is None or frame.empty:
+        return None
+    previous = _read_meta(slug) or {}
+    meta = _write(slug, keywords, frame, {"hits": previous.get("hits", 0), "last_requested": previous.get("last_requested")})
+    with _lock:
+        _frames.pop(slug, None)
+    return meta
+
+
+def get_series(keywords):
+    # Returns (frame, meta). Stored series are served immediately, even when stale; the background
+    # refresher brings popular ones up to date. Only never-seen keywords hit Google Trends inline.
+    slug, keywords = _key(keywords)
+    meta = _read_meta(slug)
+    if meta is None or not os.path.exists(_paths(slug)[0]):
+        meta = refresh(keywords)
+        if meta is None:
+            return None, None
+    _bump_hits(slug, meta)
+    start_background_refresh()
+    return _read_frame(slug, meta), dict(meta, stale=time.time() - meta["fetched_at"] > TTL)
+
+
+def _refresh_popular():
+    if not os.path.isdir(TREND_DIR):
+        return
+    metas = []
+    for name in os.listdir(TREND_DIR):
+        if name.endswith(".json"):
+            meta = _read_meta(name[:-len(".json")])
+            if meta:
+                metas.append(meta)
+    metas.sort(key=lambda m: m.get("hits", 0), reverse=True)
+    for meta in metas[:REFRESH_TOP_N]:
+        if time.time() - meta.get("fetched_at", 0) <= TTL:
+            continue
+        try:
+            refresh(meta["keywords"])
+        except Exception as e:
+            print(f"TREND REFRESH FAILED for {meta['keywords']}: {str(e)}")
+        # Space requests out so Google Trends does not rate-limit the whole batch
+        time.sleep(REFRESH_SPACING)
+
+
+def _refresh_loop():
+    while True:
+        try:
+            _refresh_popular()
+        except Exception as e:
+            print(f"TREND REFRESH ERROR: {str(e)}")
+        time.sleep(REFRESH_INTERVAL)
+
+
+def start_background_refresh():
+    global _refresher
+    with _lock:
+        if _refresher is None:
+            _refresher = threading.Thread(target=_refresh_loop, name="trend-refresh", daemon=True)
+            _refresher.start()
@@ -0,0 +1,118 @@
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from PIL import Image
+
+from response_cache import CACHE_DIR
+
+# Images whose perceptual hashes differ in at most this many of 64 bits count as the same photo
+MAX_DISTANCE = int(os.getenv("VISION_CACHE_MAX_DISTANCE", 4))
+MAX_ENTRIES = int(os.getenv("VISION_CACHE_MAX_ENTRIES", 2000))
+TTL = int(os.getenv("VISION_CACHE_TTL_SECONDS", 30 * 24 * 3600))
+
+_local = threading.local()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def image_hash(image_bytes):
+    # dHash: compare neighbouring pixels of a 9x8 grayscale thumbnail. Re-encoding, resizing
+    # and small brightness changes barely move it, unlike a hash of the raw bytes.
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        small = img.convert("L").resize((9, 8), Image.LANCZOS)
+        pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def _conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(CACHE_DIR, "vision.db"), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            "phash TEXT PRIMARY KEY, result TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        _local.conn = conn
+    return conn
+
+
+def _count(counter):
+    with _lock:
+        _stats[counter] += 1
+
+
+def lookup(image_bytes, max_distance=None):
+    max_distance = MAX_DISTANCE if max_distance is None else max_distance
+    try:
+        target = image_hash(image_bytes)
+    except Exception:
+        _count("misses")
+        return None
+    conn = _conn()
+    now = time.time()
+    best = None
+    # Exact match first, then the closest stored hash within the threshold
+    row = conn.execute("SELECT phash, result FROM analyses WHERE phash = ? AND created_at > ?",
+                       (f"{target:016x}", now - TTL)).fetchone()
+    if row:
+        best = row
+    elif max_distance > 0:
+        # The scan reads hashes only; the stored analysis is fetched for the single best match
+        best_phash, best_distance = None, max_distance + 1
+        for (phash,) in conn.execute("SELECT phash FROM analyses WHERE created_at > ?", (now - TTL,)):
+            distance = hamming_distance(target, int(phash, 16))
+            if distance < best_distance:
+                best_phash, best_distance = phash, distance
+        if best_phash is not None:
+            # None if another process evicted it in between: a miss
+            best = conn.execute("SELECT phash, result FROM analyses WHERE phash = ?", (best_phash,)).fetchone()
+    if best is None:
+        _count("misses")
+        return None
+    with conn:
+        conn.execute("UPDATE analyses SET accessed_at = ? WHERE phash = ?", (now, best[0]))
+    _count("hits")
+    return json.loads(best[1])
+
+
+def store(image_bytes, result):
+    if not result or "error" in result:
+        return
+    try:
+        key = f"{image_hash(image_bytes):016x}"
+    except Exception:
+        return
+    conn = _conn()
+    now = time.time()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO analyses (phash, result, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(result), now, now),
+        )
+        conn.execute("DELETE FROM analyses WHERE created_at < ?", (now - TTL,))
+        # Least recently used analyses go first once the cache is full
+        conn.execute(
+            "DELETE FROM analyses WHERE phash IN (SELECT phash FROM analyses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (MAX_ENTRIES,),
+        )
+
+
+def stats():
+    with _lock:
+        return dict(_stats)